@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ExecutorSaturated(Exception):
+    pass
+
+
+class ExecutorTimeout(Exception):
+    pass
+
+
+class DBExecutor:
+    """
+    Runs blocking database work on a dedicated, fixed-size thread pool.
+
+    At most ``max_pending`` calls may be queued or running at once; further calls
+    are rejected straight away instead of piling up behind a slow database.
+    Every call is bounded by a timeout that covers both queueing and execution.
+    """
+
+    def __init__(self, max_workers: int = 10, max_pending: int = 100, default_timeout: Optional[float] = 30.0,
+                 name: str = "db"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._counters: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "run_time_total": 0.0,
+        }
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._queued + self._active >= self.max_pending:
+                self._counters["rejected"] += 1
+                return False
+            self._queued += 1
+            self._counters["submitted"] += 1
+            return True
+
+    def _tracked(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Callable[[], Any]:
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            waited = started - submitted
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._counters["wait_time_total"] += waited
+                self._counters["wait_time_max"] = max(self._counters["wait_time_max"], waited)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._counters["completed" if ok else "failed"] += 1
+                    self._counters["run_time_total"] += time.monotonic() - started
+        return job
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        if not self._admit():
+            raise ExecutorSaturated(f"Database executor is saturated ({self.max_pending} calls queued or running)")
+        concurrent_future = self._pool.submit(self._tracked(fn, args, kwargs))
+        future = asyncio.wrap_future(concurrent_future)
+        timeout = self.default_timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            if concurrent_future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            # A call that already started cannot be interrupted; let it finish and drop its result.
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise ExecutorTimeout(f"Database call timed out after {timeout}s")
+
+    def submit_background(self, fn: Callable[..., Any], *args):
+        """Fire-and-forget submission for cleanup work that must not be cancelled with its caller."""
+        return self._pool.submit(fn, *args)
+
+    def try_submit_background(self, fn: Callable[..., Any], *args) -> bool:
+        """Fire-and-forget submission for optional work; counts against max_pending and is dropped when full."""
+        if not self._admit():
+            return False
+        self._pool.submit(self._tracked(fn, args, {}))
+        return True
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._counters["completed"] + self._counters["failed"] + self._active
+            finished = self._counters["completed"] + self._counters["failed"]
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self._queued,
+                "active": self._active,
+                "submitted": int(self._counters["submitted"]),
+                "completed": int(self._counters["completed"]),
+                "failed": int(self._counters["failed"]),
+                "rejected": int(self._counters["rejected"]),
+                "timeouts": int(self._counters["timeouts"]),
+                "wait_time_avg_ms": round(self._counters["wait_time_total"] / started * 1000, 3) if started else 0.0,
+                "wait_time_max_ms": round(self._counters["wait_time_max"] * 1000, 3),
+                "run_time_avg_ms": round(self._counters["run_time_total"] / finished * 1000, 3) if finished else 0.0,
+            }
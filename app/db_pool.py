@@ -0,0 +1,274 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _PoolEntry:
+    def __init__(self, raw: Any):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """Checked-out connection; close() hands it back to the pool instead of closing it."""
+
+    def __init__(self, pool: "ConnectionPool", entry: _PoolEntry):
+        self._pool = pool
+        self._entry: Optional[_PoolEntry] = entry
+        self._needs_reset = False
+
+    def _raw(self):
+        if self._entry is None:
+            raise RuntimeError("Connection has already been returned to the pool")
+        return self._entry.raw
+
+    def cursor(self, *args, **kwargs):
+        self._needs_reset = True
+        return self._raw().cursor(*args, **kwargs)
+
+    def commit(self):
+        self._raw().commit()
+        self._needs_reset = False
+
+    def rollback(self):
+        self._raw().rollback()
+        self._needs_reset = False
+
+    def close(self):
+        if self._entry is None:
+            return
+        entry, self._entry = self._entry, None
+        self._pool.release(entry, reset=self._needs_reset)
+
+    def discard(self):
+        """Returns the connection to the pool as broken so it gets closed rather than reused."""
+        if self._entry is None:
+            return
+        entry, self._entry = self._entry, None
+        self._pool.release(entry, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections.
+
+    Idle connections are kept on a LIFO stack so the warm ones get reused and the
+    cold ones age out. On checkout a connection is recycled once it is older than
+    ``max_lifetime`` and pinged when it has been idle longer than ``ping_interval``.
+    """
+
+    def __init__(
+            self,
+            connect: Callable[[], Any],
+            max_size: int = 10,
+            acquire_timeout: float = 10.0,
+            max_idle_time: float = 300.0,
+            max_lifetime: float = 1800.0,
+            ping_interval: float = 30.0,
+            ping_query: str = "SELECT 1",
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition()
+        self._idle: List[_PoolEntry] = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._counters: Dict[str, float] = {
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkout_timeouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "recycled": 0,
+            "evicted_idle": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Checkout / release
+    # ------------------------------------------------------------------
+    def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        expired: List[_PoolEntry] = []
+        entry: Optional[_PoolEntry] = None
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    expired.extend(self._pop_idle_expired(time.monotonic()))
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["checkout_timeouts"] += 1
+                        self._counters["checkout_failures"] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+                self._in_use += 1
+            finally:
+                self._waiting -= 1
+        self._close_entries(expired)
+
+        try:
+            if entry is not None and not self._is_usable(entry):
+                self._close_raw(entry.raw)
+                entry = None
+            if entry is None:
+                entry = _PoolEntry(self._connect())
+                with self._cond:
+                    self._counters["connections_created"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._counters["checkout_failures"] += 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._counters["checkouts"] += 1
+            self._counters["wait_time_total"] += waited
+            self._counters["wait_time_max"] = max(self._counters["wait_time_max"], waited)
+        return PooledConnection(self, entry)
+
+    def release(self, entry: _PoolEntry, reset: bool = True, discard: bool = False):
+        if not discard and reset:
+            # Never hand the next borrower a connection with an open transaction.
+            try:
+                entry.raw.rollback()
+            except Exception as e:
+                logging.warning(f"Discarding pooled connection after failed rollback: {str(e)}")
+                discard = True
+        now = time.monotonic()
+        if not discard and now - entry.created_at >= self.max_lifetime:
+            discard = True
+            with self._cond:
+                self._counters["recycled"] += 1
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+                self._counters["connections_closed"] += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            self._close_raw(entry.raw)
+
+    # ------------------------------------------------------------------
+    # Health checks and eviction
+    # ------------------------------------------------------------------
+    def _is_usable(self, entry: _PoolEntry) -> bool:
+        now = time.monotonic()
+        if now - entry.created_at >= self.max_lifetime:
+            with self._cond:
+                self._counters["recycled"] += 1
+                self._counters["connections_closed"] += 1
+            return False
+        if now - entry.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            return True
+        except Exception as e:
+            logging.warning(f"Pooled connection failed health check: {str(e)}")
+            with self._cond:
+                self._counters["health_check_failures"] += 1
+                self._counters["connections_closed"] += 1
+            return False
+
+    def _pop_idle_expired(self, now: float) -> List[_PoolEntry]:
+        # Oldest idle connections sit at the bottom of the stack.
+        expired = []
+        while self._idle and now - self._idle[0].last_used >= self.max_idle_time:
+            expired.append(self._idle.pop(0))
+        if expired:
+            self._size -= len(expired)
+            self._counters["evicted_idle"] += len(expired)
+            self._counters["connections_closed"] += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def evict_idle(self) -> int:
+        with self._cond:
+            expired = self._pop_idle_expired(time.monotonic())
+        self._close_entries(expired)
+        return len(expired)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._counters["connections_closed"] += len(idle)
+            self._cond.notify_all()
+        self._close_entries(idle)
+
+    def _close_entries(self, entries: List[_PoolEntry]):
+        for entry in entries:
+            self._close_raw(entry.raw)
+
+    @staticmethod
+    def _close_raw(raw: Any):
+        try:
+            raw.close()
+        except Exception as e:
+            logging.warning(f"Error closing pooled connection: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._counters["checkouts"]
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": int(checkouts),
+                "checkout_failures": int(self._counters["checkout_failures"]),
+                "checkout_timeouts": int(self._counters["checkout_timeouts"]),
+                "connections_created": int(self._counters["connections_created"]),
+                "connections_closed": int(self._counters["connections_closed"]),
+                "health_check_failures": int(self._counters["health_check_failures"]),
+                "recycled": int(self._counters["recycled"]),
+                "evicted_idle": int(self._counters["evicted_idle"]),
+                "wait_time_avg_ms": round(self._counters["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_time_max_ms": round(self._counters["wait_time_max"] * 1000, 3),
+            }
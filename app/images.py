@@ -0,0 +1,51 @@
+import hashlib
+from typing import Optional
+
+# SQL expression for the hex SHA-256 of the stored image, so listings can carry
+# the hash without pulling the blob over the wire
+PROFILE_IMAGE_HASH_SQL = "LOWER(CONVERT(VARCHAR(64), HASHBYTES('SHA2_256', {column}), 2))"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Hex digits of the image digest carried in profile image URLs as ?v=
+IMAGE_VERSION_LENGTH = 16
+
+
+def image_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_version(digest: str) -> str:
+    return digest[:IMAGE_VERSION_LENGTH]
+
+
+def image_etag(digest: str, variant: Optional[str] = None) -> str:
+    return f'"{digest}-{variant}"' if variant else f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def profile_image_url(user_id: int, digest: str) -> str:
+    # The hash in the query string makes the URL change with the image, so it can be cached forever.
+    return f"/api/Users/{user_id}/profile-image?v={image_version(digest)}"
+
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypheic"):
+        return "image/avif" if data[8:12] == b"avif" else "image/heic"
+    return "application/octet-stream"
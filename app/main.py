@@ -1,9 +1,46 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import pymssql
-from pydantic import BaseModel, create_model
+from pydantic import BaseModel, ValidationError, create_model
 from typing import Dict, Any, List, Tuple, Type, Optional
+import asyncio
 import base64
+from collections import deque
+import datetime
 import logging
+import os
+import re
+
+from app.db_executor import DBExecutor, ExecutorSaturated, ExecutorTimeout
+from app.db_pool import ConnectionPool, PoolTimeout
+from app.images import (
+    IMMUTABLE_CACHE_CONTROL, PROFILE_IMAGE_HASH_SQL, REVALIDATE_CACHE_CONTROL, etag_matches, image_digest, image_etag,
+    image_version, profile_image_url, sniff_content_type,
+)
+from app.passwords import DUMMY_PASSWORD_HASH, hash_password, is_password_hash, verify_password
+from app.post_counters import (
+    COUNTER_COLUMNS, apply_counter_deltas, counter_deltas, counter_output, ensure_counter_columns,
+    inserted_counter_row, pop_counter_values, reconcile_counters, start_background_reconcile, tracks_counters,
+)
+from app.pagination import decode_cursor, encode_cursor, keyset_condition, next_cursor, order_by
+from app.query_dsl import compile_filters, parse_order
+from app.record_cache import LocalSharedClient, MemoryBackend, RecordCache, SharedBackend
+from app.schema_cache import SchemaCache
+from app.thumbnails import THUMBNAIL_CONTENT_TYPE, thumbnail_store
+from app.realtime import (
+    SSE_KEEPALIVE, SSE_MEDIA_TYPE, InProcessBroker, SharedBroker, decode_event_id, encode_event_id, sse_message,
+)
+from app.unread_counters import (
+    COUNT_UNREAD_SQL, UNREAD_COLUMNS, UnreadCounters, inserted_unread_row, pop_unread_values, tracks_unread,
+    unread_deltas, unread_output,
+)
+from app.write_behind import DELETE, INSERT, WriteBehindQueue, cancel_pairs, entry_runs
+from app.tokens import ACCESS_TOKEN, REFRESH_TOKEN, TokenError, TokenService
+from app.streaming import (
+    JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE, StreamCursor, StreamLimiter, StreamsSaturated, json_array_chunks,
+    json_object_chunks, ndjson_chunks, release_when_done, tagged_ndjson_chunks,
+)
 
 app = FastAPI()
 
@@ -18,20 +55,117 @@ DB_DATABASE = "WeShareDB"
 DB_PORT = 1433
 
 
+# Connection pool configuration (seconds for the time limits)
+DB_POOL_MAX_SIZE = 10
+DB_POOL_ACQUIRE_TIMEOUT = 10
+DB_POOL_MAX_IDLE_TIME = 300
+DB_POOL_MAX_LIFETIME = 1800
+DB_POOL_PING_INTERVAL = 30
+
+# Executor running the blocking pymssql calls off the event loop. One worker per
+# pooled connection so workers never queue on the pool itself.
+DB_EXECUTOR_WORKERS = DB_POOL_MAX_SIZE
+DB_EXECUTOR_MAX_PENDING = 100
+DB_REQUEST_TIMEOUT = 30
+
+# Password hashing is CPU-bound, so it gets its own small pool rather than
+# competing with database calls for executor workers
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_MAX_PENDING = 64
+
+# Thumbnail rendering (Pillow) likewise runs on its own pool. Pregeneration after
+# an upload is skipped when THUMBNAIL_MAX_PENDING renders are already queued; the
+# variants are then rendered on first request instead.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_MAX_PENDING = 16
+
+def open_db_connection():
+    return pymssql.connect(
+        server=DB_SERVER,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_DATABASE,
+        port=DB_PORT,
+        timeout=DB_REQUEST_TIMEOUT
+    )
+
+db_pool = ConnectionPool(
+    open_db_connection,
+    max_size=DB_POOL_MAX_SIZE,
+    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    max_idle_time=DB_POOL_MAX_IDLE_TIME,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    ping_interval=DB_POOL_PING_INTERVAL,
+)
+
+db_executor = DBExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    max_pending=DB_EXECUTOR_MAX_PENDING,
+    default_timeout=DB_REQUEST_TIMEOUT,
+)
+
+password_executor = DBExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    default_timeout=DB_REQUEST_TIMEOUT,
+    name="password",
+)
+
+thumbnail_executor = DBExecutor(
+    max_workers=THUMBNAIL_WORKERS,
+    max_pending=THUMBNAIL_MAX_PENDING,
+    default_timeout=DB_REQUEST_TIMEOUT,
+    name="thumbnail",
+)
+
+
 def get_db_connection():
+    # Connections come from the pool; conn.close() returns them to it.
     try:
-        conn = pymssql.connect(
-            server=DB_SERVER,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_DATABASE,
-            port=DB_PORT
-        )
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logging.error(f"Database connection pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logging.error(f"Database connection failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
 
+
+async def run_db(fn, *args, **kwargs):
+    # Blocking DB work goes through the bounded executor so it never stalls the event loop.
+    try:
+        return await db_executor.run(fn, *args, **kwargs)
+    except ExecutorSaturated as e:
+        logging.error(f"Database executor saturated: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ExecutorTimeout as e:
+        logging.error(f"Database call timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+
+async def run_password_work(fn, *args):
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorSaturated as e:
+        logging.error(f"Password executor saturated: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ExecutorTimeout as e:
+        logging.error(f"Password hashing timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+
+async def run_thumbnail_work(fn, *args):
+    try:
+        return await thumbnail_executor.run(fn, *args)
+    except ExecutorSaturated as e:
+        logging.error(f"Thumbnail executor saturated: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ExecutorTimeout as e:
+        logging.error(f"Thumbnail rendering timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+
+def pregenerate_thumbnails(image: bytes):
+    if not thumbnail_executor.try_submit_background(thumbnail_store.pregenerate, image):
+        logging.warning("Thumbnail executor is full; variants will render on first request")
+
 # Mapping of each table to its primary key column
 tables = {
     "ChatbotMessages": "chat_id",
@@ -49,6 +183,98 @@ tables = {
 # List of tables that support soft deletion
 soft_delete_tables = ["Comments", "Messages", "Posts", "Users"]
 
+# Schema snapshot location and background refresh period in seconds (0 disables it).
+# Commit the file written by `python -m app.main schema-snapshot`; vercel.json
+# bundles it. Without a deployed snapshot every cold start runs the one catalog
+# query, since read-only serverless filesystems cannot keep the written-back copy.
+SCHEMA_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_snapshot.json")
+SCHEMA_REFRESH_INTERVAL = 0
+
+# Page sizes for the generic GET /api/{table} endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Most IDs one GET /api/{table}?ids= call may ask for
+MAX_MULTI_GET_IDS = 1000
+
+# Most operations one POST /api/batch call may carry
+MAX_BATCH_OPERATIONS = 100
+
+# Rows fetched per round trip when streaming (?stream=ndjson|json), and the most
+# streams open at once; each pins a pooled connection, so keep this below DB_POOL_MAX_SIZE
+STREAM_BATCH_SIZE = 500
+STREAM_MAX_CONCURRENT = max(1, DB_POOL_MAX_SIZE // 2)
+
+# Delta sync: datetime watermarks are re-read with this much overlap so rows
+# committed late with an earlier timestamp are not missed
+SYNC_TOKEN_VERSION = 1
+SYNC_OVERLAP_SECONDS = 5
+
+# Tables that `python -m app.main add-rowversion` gives a rowversion column, so
+# delta sync can send their changes instead of the whole table. Posts needs one
+# because counter updates leave its updated_at (the "edited" time) alone.
+SYNC_ROWVERSION_TABLES = ("Likes", "Notifications", "Posts")
+SYNC_ROWVERSION_COLUMN = "row_version"
+
+# Bulk writes: rows per multi-row INSERT, capped by SQL Server's limits of 1000
+# rows per VALUES list and 2100 parameters per statement
+BULK_INSERT_BATCH_SIZE = 500
+BULK_MAX_ROWS = 10000
+SQL_SERVER_MAX_INSERT_ROWS = 1000
+SQL_SERVER_MAX_PARAMS = 2000
+
+# Read-through cache for GET /api/{table}/{id}. "memory" keeps records in this
+# process; "shared" uses RECORD_CACHE_URL (redis) or, when that is unset, a
+# local stand-in with the same interface.
+RECORD_CACHE_BACKEND = "memory"
+RECORD_CACHE_URL = None
+RECORD_CACHE_TTL = 60
+RECORD_CACHE_MAX_ENTRIES = 10000
+
+# Tables read concurrently (each on its own pooled connection) by one /api/all-data request
+ALL_DATA_PARALLELISM = 4
+
+# Posts.like_count / comment_count are kept in step with Likes and Comments once
+# `python -m app.main reconcile-counters` has added them. A positive interval
+# (seconds) also re-runs the drift repair in the background.
+POST_COUNTER_RECONCILE_INTERVAL = 0
+
+# Per-user unread notification counts for /api/unread-notifications/{user_id},
+# held in memory and adjusted by Notifications writes; entries are rebuilt from
+# SQL on a miss and after this many seconds, which bounds drift from other workers.
+UNREAD_COUNTER_TTL = 300
+
+# Opt-in write-behind for bursty inserts, e.g. ("Likes", "Notifications"): POSTs
+# are acknowledged with 202 once appended to a local fsynced log, and flushed to
+# SQL Server in multi-row batches every WRITE_BEHIND_MAX_DELAY seconds or
+# WRITE_BEHIND_MAX_BATCH entries, whichever comes first. Each worker process logs
+# to its own subdirectory of WRITE_BEHIND_DIR and replays only exited workers' logs.
+WRITE_BEHIND_TABLES: Tuple[str, ...] = ()
+WRITE_BEHIND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "write_behind_log")
+WRITE_BEHIND_MAX_BATCH = 500
+WRITE_BEHIND_MAX_DELAY = 0.5
+
+# Server-sent events for new Messages/Notifications at /api/events/{user_id}.
+# "memory" fans out inside this process; "shared" publishes through
+# REALTIME_BROKER_URL (redis) so clients on any worker receive every event.
+REALTIME_BROKER = "memory"
+REALTIME_BROKER_URL = None
+REALTIME_QUEUE_SIZE = 256
+REALTIME_KEEPALIVE_SECONDS = 15
+REALTIME_CATCHUP_LIMIT = 500
+# Table -> column holding the user an inserted row is delivered to
+REALTIME_RECIPIENTS = {"Messages": "receiver_id", "Notifications": "user_id"}
+
+# Session tokens issued by /api/login (lifetimes in seconds). Every process must
+# share SHADOWTALK_TOKEN_SECRET; without it token issue and verification answer
+# 503 while the rest of the API keeps working. Only development runs
+# (SHADOWTALK_DEV=1, set by the `serve` command, or the CLI commands) fall back
+# to a random per-process secret whose tokens do not survive a restart.
+TOKEN_SECRET = os.environ.get("SHADOWTALK_TOKEN_SECRET")
+DEV_MODE = os.environ.get("SHADOWTALK_DEV") == "1" or __name__ == "__main__"
+ACCESS_TOKEN_TTL = 15 * 60
+REFRESH_TOKEN_TTL = 30 * 24 * 60 * 60
+
 # ----------------------------------------------------------------------
 # DYNAMIC MODEL GENERATION (same as before)
 # ----------------------------------------------------------------------
@@ -71,29 +297,106 @@ def sql_type_to_python_type(sql_type: str) -> Type:
     else:
         return Optional[str]
 
+def is_rowversion_type(sql_type: str) -> bool:
+    return sql_type.lower() in ("timestamp", "rowversion")
+
+# Column metadata comes from the on-disk schema snapshot, so a cold start builds
+# table_models without touching the database. Regenerate the snapshot with
+# `python -m app.main schema-snapshot` after schema changes.
+schema_cache = SchemaCache(list(tables.keys()), SCHEMA_SNAPSHOT_PATH, get_db_connection)
+schema_cache.load()
+if SCHEMA_REFRESH_INTERVAL:
+    schema_cache.start_background_refresh(SCHEMA_REFRESH_INTERVAL)
+
 def get_table_columns(table_name: str) -> List[Tuple[str, str]]:
-    conn = get_db_connection()
+    return schema_cache.columns(table_name)
+
+# ----------------------------------------------------------------------
+# RECORD CACHE
+# ----------------------------------------------------------------------
+def create_shared_cache_client():
+    if RECORD_CACHE_URL:
+        import redis
+        return redis.Redis.from_url(RECORD_CACHE_URL)
+    return LocalSharedClient()
+
+shared_cache_client = create_shared_cache_client() if RECORD_CACHE_BACKEND == "shared" else None
+
+def create_record_cache_backend(table_name: str):
+    if RECORD_CACHE_BACKEND == "shared":
+        return SharedBackend(shared_cache_client, f"shadowtalk:records:{table_name}")
+    return MemoryBackend(RECORD_CACHE_MAX_ENTRIES)
+
+record_cache = RecordCache(create_record_cache_backend, RECORD_CACHE_TTL)
+
+# ----------------------------------------------------------------------
+# SESSION TOKENS
+# ----------------------------------------------------------------------
+token_service = None
+if TOKEN_SECRET or DEV_MODE:
+    if not TOKEN_SECRET:
+        logging.warning("SHADOWTALK_TOKEN_SECRET is not set; using a random token secret for development")
+    token_service = TokenService(
+        TOKEN_SECRET.encode("utf-8") if TOKEN_SECRET else os.urandom(32),
+        access_ttl=ACCESS_TOKEN_TTL,
+        refresh_ttl=REFRESH_TOKEN_TTL,
+    )
+else:
+    logging.warning("SHADOWTALK_TOKEN_SECRET is not set; login, token refresh and authenticated endpoints answer 503")
+
+def require_token_service() -> TokenService:
+    # A per-process random secret would issue tokens other workers reject, so none are issued at all.
+    if token_service is None:
+        raise HTTPException(status_code=503, detail="Session tokens are unavailable: SHADOWTALK_TOKEN_SECRET is not set")
+    return token_service
+
+def bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+def get_current_user(request: Request) -> Dict[str, Any]:
+    """Dependency returning the verified access-token claims; no database access."""
+    token = bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
     try:
-        cursor = conn.cursor()
-        query = """
-            SELECT COLUMN_NAME, DATA_TYPE 
-            FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = %s
-            ORDER BY ORDINAL_POSITION
-        """
-        cursor.execute(query, (table_name,))
-        columns = cursor.fetchall()
-        return columns
-    except Exception as e:
-        logging.error(f"Error getting columns for {table_name}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+        claims = require_token_service().decode(token, ACCESS_TOKEN)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    return dict(claims, user_id=int(claims["sub"]))
+
+# ----------------------------------------------------------------------
+# REALTIME BROKER
+# ----------------------------------------------------------------------
+def create_realtime_broker():
+    if REALTIME_BROKER == "shared":
+        import redis
+        return SharedBroker(redis.Redis.from_url(REALTIME_BROKER_URL), "shadowtalk:events")
+    return InProcessBroker()
+
+realtime_broker = create_realtime_broker()
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def publish_inserted(table_name: str, records: List[Dict[str, Any]]):
+    # Called after commit, from whichever thread did the write.
+    recipient_column = REALTIME_RECIPIENTS.get(table_name)
+    if recipient_column is None:
+        return
+    pk_name = tables[table_name]
+    for record in records:
+        if record.get(recipient_column) is not None:
+            realtime_broker.publish(user_channel(record[recipient_column]),
+                                    {"table": table_name, "id": record[pk_name], "record": record})
 
 def create_pydantic_model_for_table(table_name: str) -> Type[BaseModel]:
     columns = get_table_columns(table_name)
     model_fields = {}
     for col_name, data_type in columns:
+        # rowversion columns are maintained by the server and only used by delta sync.
+        if is_rowversion_type(data_type):
+            continue
         python_type = sql_type_to_python_type(data_type)
         model_fields[col_name] = (python_type, None)
     model = create_model(f"{table_name}Model", **model_fields)
@@ -103,28 +406,323 @@ table_models: Dict[str, Type[BaseModel]] = {}
 for table_name in tables.keys():
     table_models[table_name] = create_pydantic_model_for_table(table_name)
 
+def column_names(table_name: str) -> List[str]:
+    return [col_name for col_name, _ in get_table_columns(table_name)]
+
+# Columns that can be written but are never read back to a client.
+SECRET_COLUMNS = {"Users": ("password_hash",)}
+
+def readable_columns(table_name: str) -> List[str]:
+    secret = SECRET_COLUMNS.get(table_name, ())
+    return [col for col, data_type in get_table_columns(table_name)
+            if col not in secret and not is_rowversion_type(data_type)]
+
+def timestamp_columns(table_name: str) -> List[str]:
+    names = column_names(table_name)
+    return [col for col in ("created_at", "updated_at") if col in names]
+
+def touch_updated_at(table_name: str, data_dict: Optional[Dict[str, Any]] = None) -> List[str]:
+    # Every write bumps updated_at so delta sync picks it up.
+    if "updated_at" in column_names(table_name) and "updated_at" not in (data_dict or {}):
+        return ["updated_at = GETDATE()"]
+    return []
+
+# ----------------------------------------------------------------------
+# COLUMN PROJECTION (?fields=)
+# ----------------------------------------------------------------------
+def parse_fields(table_name: str, fields: Optional[str], required: Tuple[str, ...] = ()) -> Optional[List[str]]:
+    # Only columns of the table's model are accepted, so the names are safe to put in SQL.
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    allowed = table_models[table_name].model_fields
+    unknown = [field for field in requested if field not in allowed or field in SECRET_COLUMNS.get(table_name, ())]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s) for {table_name}: {', '.join(unknown)}")
+    return list(dict.fromkeys(list(required) + requested))
+
+def parse_table_fields(fields: Optional[str], selected: List[str]) -> Dict[str, Optional[List[str]]]:
+    # /api/all-data takes table-qualified names, e.g. fields=Users.username,Posts.content
+    grouped: Dict[str, List[str]] = {}
+    for field in (fields or "").split(","):
+        field = field.strip()
+        if not field:
+            continue
+        table_name, _, column = field.partition(".")
+        if not column or table_name not in tables:
+            raise HTTPException(status_code=400, detail=f"Fields must be given as Table.column, got '{field}'")
+        grouped.setdefault(table_name, []).append(column)
+    return {
+        table_name: parse_fields(table_name, ",".join(grouped[table_name]), (tables[table_name],))
+        if table_name in grouped else None
+        for table_name in selected
+    }
+
+def project_record(table_name: str, record: Dict[str, Any], columns: Optional[List[str]]) -> Dict[str, Any]:
+    if not columns:
+        # Shared-cache entries written before SECRET_COLUMNS existed may still carry them.
+        secret = SECRET_COLUMNS.get(table_name, ())
+        return {key: value for key, value in record.items() if key not in secret} if secret else record
+    keys = []
+    for col in columns:
+        if table_name == "Users" and col == "profile_image":
+            keys.extend(["profile_image_hash", "profile_image_url"])
+        else:
+            keys.append(col)
+    return {key: record[key] for key in keys if key in record}
+
+def select_columns(table_name: str, columns: Optional[List[str]] = None) -> str:
+    if table_name == "Users":
+        # Users rows carry a hash of the avatar instead of the blob itself, and never the password hash.
+        columns = columns or readable_columns(table_name)
+        return ", ".join(
+            f"{PROFILE_IMAGE_HASH_SQL.format(column='profile_image')} AS profile_image_hash"
+            if col == "profile_image" else col
+            for col in columns
+        )
+    if not columns:
+        # Spelled out only when a rowversion column has to be left out.
+        readable = readable_columns(table_name)
+        return ", ".join(readable) if len(readable) < len(column_names(table_name)) else "*"
+    return ", ".join(columns)
+
 def clean_users_record(record: Dict[str, Any]) -> Dict[str, Any]:
-    if "profile_image" in record and record["profile_image"]:
+    # Replace the avatar with its content hash and a cacheable URL (see /api/Users/{id}/profile-image).
+    record.pop("password_hash", None)
+    if "profile_image" in record:
+        image = record.pop("profile_image")
+        record["profile_image_hash"] = image_digest(image) if isinstance(image, (bytes, bytearray)) and image else None
+    if "profile_image_hash" in record:
+        digest = record["profile_image_hash"]
+        user_id = record.get("user_id")
+        record["profile_image_url"] = profile_image_url(user_id, digest) if digest and user_id is not None else None
+    return record
+
+# ----------------------------------------------------------------------
+# STREAMING READS
+# ----------------------------------------------------------------------
+def select_all_query(table_name: str, top: Optional[int] = None, columns: Optional[List[str]] = None,
+                     conditions: Tuple[str, ...] = ()) -> str:
+    select_list = select_columns(table_name, columns)
+    select = f"SELECT TOP ({top}) {select_list}" if top is not None else f"SELECT {select_list}"
+    conditions = (["is_deleted = 0"] if table_name in soft_delete_tables else []) + list(conditions)
+    if conditions:
+        return f"{select} FROM {table_name} WHERE {' AND '.join(conditions)}"
+    return f"{select} FROM {table_name}"
+
+def parse_where(table_name: str, where: Optional[List[str]]) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+    # ?where=column:operator:value, repeatable; see app/query_dsl.py for the operators.
+    if not where:
+        return (), ()
+    allowed = table_models[table_name].model_fields
+    column_types = {name: sql_type for name, sql_type in get_table_columns(table_name) if name in allowed}
+    try:
+        conditions, params = compile_filters(where, column_types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return tuple(conditions), tuple(params)
+
+async def stream_row_batches(table_name: str, query: str, params: tuple = ()):
+    # Rows are pulled with fetchmany so memory stays flat whatever the table size.
+    # The connection is checked out on the executor, inside the try.
+    stream = StreamCursor(get_db_connection)
+    try:
+        await run_db(stream.execute, query, params)
+        while True:
+            rows = await run_db(stream.fetchmany, STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if table_name == "Users":
+                rows = [clean_users_record(r) for r in rows]
+            yield rows
+    finally:
+        # Don't await here: a client disconnect cancels this generator, and the
+        # connection must still make it back to the pool (see StreamCursor).
+        db_executor.submit_background(stream.close)
+
+stream_limiter = StreamLimiter(STREAM_MAX_CONCURRENT)
+
+def streaming_response(chunks, stream_format: str) -> StreamingResponse:
+    # Admitted before the response starts, so a full limiter can still answer 503.
+    # The slot is released when the body finishes or, if it never started, after the response.
+    try:
+        release = stream_limiter.acquire()
+    except StreamsSaturated as e:
+        logging.error(f"Stream rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Too many concurrent streams; retry shortly")
+    media_type = NDJSON_MEDIA_TYPE if stream_format == "ndjson" else JSON_MEDIA_TYPE
+    return StreamingResponse(release_when_done(chunks, release), media_type=media_type,
+                             background=BackgroundTask(release))
+
+# ----------------------------------------------------------------------
+# WRITE HELPERS
+# ----------------------------------------------------------------------
+def prepare_write_data(table_name: str, pk_name: str, data_dict: Dict[str, Any]) -> Dict[str, Any]:
+    if pk_name in data_dict:
+        data_dict.pop(pk_name)
+    if table_name == "Users" and "profile_image" in data_dict and data_dict["profile_image"]:
         try:
-            record["profile_image"] = base64.b64encode(record["profile_image"]).decode('utf-8')
+            data_dict["profile_image"] = base64.b64decode(data_dict["profile_image"])
         except Exception as e:
-            logging.error(f"Error encoding profile image: {str(e)}")
-            record["profile_image"] = ""
-    return record
+            raise HTTPException(status_code=400, detail="Invalid base64 for profile_image: " + str(e))
+    return data_dict
+
+def hash_password_field(table_name: str, data_dict: Dict[str, Any]) -> Dict[str, Any]:
+    # Users.password_hash is written as given only when it already is a hash.
+    password = data_dict.get("password_hash") if table_name == "Users" else None
+    if password and not is_password_hash(password):
+        data_dict["password_hash"] = hash_password(password)
+    return data_dict
+
+def needs_password_hash(table_name: str, data_dict: Dict[str, Any]) -> bool:
+    password = data_dict.get("password_hash") if table_name == "Users" else None
+    return bool(password) and not is_password_hash(password)
+
+async def secure_write_data(table_name: str, data_dict: Dict[str, Any]) -> Dict[str, Any]:
+    if needs_password_hash(table_name, data_dict):
+        return await run_password_work(hash_password_field, table_name, data_dict)
+    return data_dict
+
+async def secure_write_rows(table_name: str, rows: List[Dict[str, Any]]):
+    # Hashed in place on the password pool, PASSWORD_HASH_WORKERS at a time, so a
+    # large request neither saturates that pool nor runs scrypt on DB workers.
+    pending = [row for row in rows if needs_password_hash(table_name, row)]
+    for start in range(0, len(pending), PASSWORD_HASH_WORKERS):
+        await asyncio.gather(*(run_password_work(hash_password_field, table_name, row)
+                               for row in pending[start:start + PASSWORD_HASH_WORKERS]))
+
+def maintains_post_counters(table_name: str) -> bool:
+    # Counters are only maintained once the Posts columns exist (see reconcile-counters).
+    posts_columns = column_names("Posts")
+    return tracks_counters(table_name) and all(col in posts_columns for col in COUNTER_COLUMNS)
+
+def moves_counted_rows(table_name: str, data_dict: Dict[str, Any]) -> bool:
+    return maintains_post_counters(table_name) and ("post_id" in data_dict or "is_deleted" in data_dict)
+
+def update_post_counters(cursor, table_name: str, rows: List[Dict[str, Any]]) -> List[int]:
+    # Runs on the write's own cursor, so counters commit or roll back with it.
+    # Posts.updated_at is left alone: it marks content edits. Delta sync sees the
+    # new counts through Posts.row_version (see reconcile-counters).
+    deltas = counter_deltas(rows)
+    return apply_counter_deltas(cursor, table_name, deltas) if deltas else []
+
+def invalidate_posts(post_ids: List[int]):
+    for post_id in post_ids:
+        record_cache.invalidate("Posts", post_id)
+
+unread_counters = UnreadCounters(UNREAD_COUNTER_TTL)
+
+def moves_unread(table_name: str, data_dict: Dict[str, Any]) -> bool:
+    return tracks_unread(table_name) and any(col in data_dict for col in UNREAD_COLUMNS)
+
+def hold_unread(rows: List[Dict[str, Any]]) -> Dict[int, int]:
+    # Held before commit, applied after it with unread_counters.apply.
+    deltas = unread_deltas(rows)
+    if deltas:
+        unread_counters.hold(deltas)
+    return deltas
+
+def run_after_commit(after_commit: List[Tuple[Any, ...]]):
+    """
+    Runs the (fn, *args) side effects of a committed write. The rows are already
+    durable, so a failing cache, counter or realtime update is only logged; turning
+    it into an error response would make clients retry a write that succeeded.
+    """
+    for fn, *args in after_commit:
+        try:
+            fn(*args)
+        except Exception as e:
+            logging.error(f"Post-commit {getattr(fn, '__qualname__', fn)} failed: {str(e)}")
+
+if POST_COUNTER_RECONCILE_INTERVAL:
+    start_background_reconcile(get_db_connection, POST_COUNTER_RECONCILE_INTERVAL, invalidate_posts)
+
+def insert_values_sql(table_name: str, columns: List[str], row_count: int, output: str = "") -> str:
+    # Timestamp columns the client left out are filled in by the server.
+    stamps = [col for col in timestamp_columns(table_name) if col not in columns]
+    row = "(" + ", ".join(["%s"] * len(columns) + ["GETDATE()"] * len(stamps)) + ")"
+    output = f" {output}" if output else ""
+    return f"INSERT INTO {table_name} ({', '.join(list(columns) + stamps)}){output} VALUES {', '.join([row] * row_count)}"
+
+def parse_return_fields(table_name: str, pk_name: str, return_fields: Optional[str]) -> Optional[List[str]]:
+    # ?return=* echoes the whole stored row, ?return=a,b a projection of it (always with the primary key).
+    if return_fields is None or return_fields.strip() == "*":
+        return None
+    return parse_fields(table_name, return_fields, required=(pk_name,))
+
+def output_clause(table_name: str, columns: Optional[List[str]] = None, extra: Tuple[str, ...] = ()) -> str:
+    """
+    OUTPUT INSERTED.<cols> so a write hands back the stored row, server defaults
+    and identity included, without a second round trip. SQL Server rejects a
+    bare OUTPUT on tables with enabled triggers; such tables need OUTPUT ... INTO.
+    """
+    columns = columns or readable_columns(table_name)
+    return "OUTPUT " + ", ".join([
+        f"{PROFILE_IMAGE_HASH_SQL.format(column='INSERTED.profile_image')} AS profile_image_hash"
+        if table_name == "Users" and col == "profile_image" else f"INSERTED.{col}"
+        for col in columns
+    ] + list(extra))
+
+def write_output(table_name: str, returning: bool, columns: Optional[List[str]] = None,
+                 extra: Tuple[str, ...] = ()) -> str:
+    if returning:
+        return output_clause(table_name, columns, extra)
+    return "OUTPUT " + ", ".join(extra) if extra else ""
+
+def returned_record(table_name: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    return clean_users_record(record) if table_name == "Users" else record
+
+class BulkSelection(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[Dict[str, Any]] = None
+
+class BulkUpdateRequest(BulkSelection):
+    patch: Dict[str, Any]
+
+def coerce_filter_value(model: Type[BaseModel], column: str, value: Any) -> Any:
+    try:
+        return getattr(model(**{column: value}), column)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter value for {column}: {str(e)}")
+
+def selection_conditions(table_name: str, pk_name: str, selection: BulkSelection) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions for a bulk operation: an ID list and/or a column filter, never the whole table."""
+    if not selection.ids and not selection.filter:
+        raise HTTPException(status_code=400, detail="Provide 'ids' or a non-empty 'filter'")
+    model = table_models[table_name]
+    conditions, params = [], []
+    for column, value in (selection.filter or {}).items():
+        if column not in model.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown filter column for {table_name}: {column}")
+        if value is None:
+            conditions.append(f"{column} IS NULL")
+        elif isinstance(value, list):
+            if not value:
+                raise HTTPException(status_code=400, detail=f"Empty value list for filter column {column}")
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(value))})")
+            params.extend(coerce_filter_value(model, column, item) for item in value)
+        else:
+            conditions.append(f"{column} = %s")
+            params.append(coerce_filter_value(model, column, value))
+    return conditions, params
+
+def id_chunks(ids: Optional[List[int]], reserved_params: int) -> List[Optional[List[int]]]:
+    # IN lists are split to stay under SQL Server's parameter limit; no ids means one unchunked statement.
+    if not ids:
+        return [None]
+    ids = list(dict.fromkeys(ids))
+    size = max(1, SQL_SERVER_MAX_PARAMS - reserved_params)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
 
 # ----------------------------------------------------------------------
 # CRUD Endpoint Factories (get, post, put, delete) – same as before
 # ----------------------------------------------------------------------
 def create_get_all_endpoint(table_name: str, pk_name: str):
-    async def get_all_records():
+    def fetch_all_records(columns: Optional[List[str]], filters: Tuple[str, ...], filter_params: Tuple[Any, ...]):
         conn = get_db_connection()
         try:
             cursor = conn.cursor(as_dict=True)
-            if table_name in soft_delete_tables:
-                query = f"SELECT * FROM {table_name} WHERE is_deleted = 0"
-            else:
-                query = f"SELECT * FROM {table_name}"
-            cursor.execute(query)
+            cursor.execute(select_all_query(table_name, columns=columns, conditions=filters), filter_params)
             records = cursor.fetchall()
             if table_name == "Users":
                 records = [clean_users_record(r) for r in records]
@@ -134,17 +732,148 @@ def create_get_all_endpoint(table_name: str, pk_name: str):
             raise HTTPException(status_code=500, detail=str(e))
         finally:
             conn.close()
+
+    def fetch_page(limit: int, sort_column: str, descending: bool, after: Optional[Dict[str, Any]],
+                   columns: Optional[List[str]], filters: Tuple[str, ...], filter_params: Tuple[Any, ...]):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(as_dict=True)
+            conditions, params = list(filters), list(filter_params)
+            if table_name in soft_delete_tables:
+                conditions.insert(0, "is_deleted = 0")
+            if after is not None:
+                condition, condition_params = keyset_condition(sort_column, pk_name, descending, after["v"], after["k"])
+                conditions.append(condition)
+                params.extend(condition_params)
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = (
+                f"SELECT TOP ({limit + 1}) {select_columns(table_name, columns)} FROM {table_name}{where} "
+                f"ORDER BY {order_by(sort_column, pk_name, descending)}"
+            )
+            cursor.execute(query, tuple(params))
+            records = cursor.fetchall()
+            cursor_token = next_cursor(records, limit, sort_column, pk_name, descending)
+            records = records[:limit]
+            if table_name == "Users":
+                records = [clean_users_record(r) for r in records]
+            return {"items": records, "next_cursor": cursor_token, "limit": limit}
+        except Exception as e:
+            logging.error(f"Error in get_all_records for {table_name}: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
+
+    def fetch_records_by_ids(ids: List[int], columns: Optional[List[str]]):
+        # Cached records are served as-is; the rest come back from one IN query and fill the cache.
+        found: Dict[int, Dict[str, Any]] = {}
+        misses = []
+        for id in ids:
+            record = record_cache.get(table_name, id)
+            if record is None:
+                misses.append(id)
+            else:
+                found[id] = record
+        if misses:
+            generation = record_cache.generation(table_name)
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor(as_dict=True)
+                conditions = [f"{pk_name} IN ({', '.join(['%s'] * len(misses))})"]
+                if table_name in soft_delete_tables:
+                    conditions.append("is_deleted = 0")
+                query = f"SELECT {select_columns(table_name)} FROM {table_name} WHERE {' AND '.join(conditions)}"
+                cursor.execute(query, tuple(misses))
+                for record in cursor.fetchall():
+                    if table_name == "Users":
+                        record = clean_users_record(record)
+                    found[record[pk_name]] = record
+                    record_cache.fill(table_name, record[pk_name], record, generation)
+            except Exception as e:
+                logging.error(f"Error in get_all_records for {table_name}: {str(e)}")
+                raise HTTPException(status_code=500, detail=str(e))
+            finally:
+                conn.close()
+        return {
+            "items": [project_record(table_name, found[id], columns) for id in ids if id in found],
+            "missing": [id for id in ids if id not in found],
+        }
+
+    async def get_all_records(
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+            cursor: Optional[str] = None,
+            sort: Optional[str] = None,
+            order: str = "asc",
+            all_rows: bool = Query(False, alias="all"),
+            stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+            fields: Optional[str] = None,
+            ids: Optional[str] = None,
+            where: Optional[List[str]] = Query(None),
+    ):
+        if ids is not None:
+            return await run_db(fetch_records_by_ids, parse_id_list(ids), parse_fields(table_name, fields, (pk_name,)))
+        filters, filter_params = parse_where(table_name, where)
+        # Streaming covers every matching row, fetched in batches.
+        if stream:
+            columns = parse_fields(table_name, fields)
+            query = select_all_query(table_name, columns=columns, conditions=filters)
+            batches = stream_row_batches(table_name, query, filter_params)
+            chunks = ndjson_chunks(batches) if stream == "ndjson" else json_array_chunks(batches)
+            return streaming_response(chunks, stream)
+        # Full table dumps are opt-in; by default results are keyset-paginated.
+        if all_rows:
+            return await run_db(fetch_all_records, parse_fields(table_name, fields), filters, filter_params)
+        # order is either a direction for ?sort= or column[:direction] on its own.
+        if order not in ("asc", "desc"):
+            try:
+                order_column, order_descending = parse_order(order)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if sort and sort != order_column:
+                raise HTTPException(status_code=400, detail="Use either sort or order=column:direction, not both")
+            sort, order = order_column, "desc" if order_descending else "asc"
+        sort_column = sort or pk_name
+        if sort_column != pk_name and sort_column not in schema_cache.indexed_columns(table_name):
+            raise HTTPException(status_code=400, detail=f"Cannot sort {table_name} by '{sort_column}'; "
+                                                        f"sortable columns: {sortable_columns(table_name, pk_name)}")
+        descending = order == "desc"
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if after.get("s") != sort_column or after.get("o") != order or "k" not in after:
+                raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+        # The cursor is built from the sort column and primary key, so those are always selected.
+        columns = parse_fields(table_name, fields, tuple(dict.fromkeys((pk_name, sort_column))))
+        return await run_db(fetch_page, limit, sort_column, descending, after, columns, filters, filter_params)
     return get_all_records
 
+def parse_id_list(ids: str) -> List[int]:
+    try:
+        parsed = [int(id) for id in ids.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(parsed) > MAX_MULTI_GET_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MULTI_GET_IDS} ids per request")
+    return parsed
+
+def sortable_columns(table_name: str, pk_name: str) -> List[str]:
+    indexed = schema_cache.indexed_columns(table_name)
+    return [pk_name] + [col for col in indexed if col != pk_name]
+
 def create_get_one_endpoint(table_name: str, pk_name: str):
-    async def get_record_by_id(id: int):
+    def fetch_record_by_id(id: int, columns: Optional[List[str]]):
         conn = get_db_connection()
         try:
             cursor = conn.cursor(as_dict=True)
             if table_name in soft_delete_tables:
-                query = f"SELECT * FROM {table_name} WHERE {pk_name} = %s AND is_deleted = 0"
+                query = f"SELECT {select_columns(table_name, columns)} FROM {table_name} WHERE {pk_name} = %s AND is_deleted = 0"
             else:
-                query = f"SELECT * FROM {table_name} WHERE {pk_name} = %s"
+                query = f"SELECT {select_columns(table_name, columns)} FROM {table_name} WHERE {pk_name} = %s"
             cursor.execute(query, (id,))
             record = cursor.fetchone()
             if not record:
@@ -152,33 +881,52 @@ def create_get_one_endpoint(table_name: str, pk_name: str):
             if table_name == "Users":
                 record = clean_users_record(record)
             return record
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error in get_record_by_id for {table_name}: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
         finally:
             conn.close()
+
+    def read_record_through_cache(id: int, columns: Optional[List[str]]):
+        # Whole records are cached; projections are cut from the cached copy.
+        record = record_cache.get(table_name, id)
+        if record is None:
+            generation = record_cache.generation(table_name)
+            record = fetch_record_by_id(id, None)
+            record_cache.fill(table_name, id, record, generation)
+        return project_record(table_name, record, columns)
+
+    async def get_record_by_id(id: int, fields: Optional[str] = None):
+        return await run_db(read_record_through_cache, id, parse_fields(table_name, fields))
     return get_record_by_id
 
 def create_post_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
-    async def insert_record(data: model):
-        data_dict = data.dict(exclude_unset=True)
-        if not data_dict:
-            raise HTTPException(status_code=400, detail="No fields provided for insertion")
-        if pk_name in data_dict:
-            data_dict.pop(pk_name)
-        if table_name == "Users" and "profile_image" in data_dict and data_dict["profile_image"]:
-            try:
-                data_dict["profile_image"] = base64.b64decode(data_dict["profile_image"])
-            except Exception as e:
-                raise HTTPException(status_code=400, detail="Invalid base64 for profile_image: " + str(e))
+    def write_record(data_dict: Dict[str, Any], returning: bool, columns: Optional[List[str]]):
         conn = get_db_connection()
         try:
-            cursor = conn.cursor()
-            columns = ", ".join(data_dict.keys())
-            placeholders = ", ".join(["%s"] * len(data_dict))
-            query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+            cursor = conn.cursor(as_dict=True)
+            # Rows pushed to realtime subscribers or counted as unread are read back whole,
+            # whatever ?return= asked for.
+            publishing = table_name in REALTIME_RECIPIENTS
+            full_row = publishing or tracks_unread(table_name)
+            output = output_clause(table_name, None if full_row else columns) if returning or full_row else ""
+            query = insert_values_sql(table_name, list(data_dict.keys()), 1, output)
             cursor.execute(query, tuple(data_dict.values()))
+            record = cursor.fetchone() if output else None
+            touched_posts = []
+            if maintains_post_counters(table_name):
+                touched_posts = update_post_counters(cursor, table_name, [inserted_counter_row(data_dict)])
+            unread = hold_unread([inserted_unread_row(record)]) if tracks_unread(table_name) and record else {}
             conn.commit()
+            after_commit = [(invalidate_posts, touched_posts), (unread_counters.apply, unread)]
+            if publishing and record:
+                after_commit.append((publish_inserted, table_name, [dict(record)]))
+            run_after_commit(after_commit)
+            if returning:
+                record = project_record(table_name, returned_record(table_name, record), columns)
+                return {"message": "Record inserted successfully", "record": record}
             return {"message": "Record inserted successfully"}
         except Exception as e:
             conn.rollback()
@@ -186,48 +934,99 @@ def create_post_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
             raise HTTPException(status_code=500, detail="Error inserting record into " + table_name + ": " + str(e))
         finally:
             conn.close()
-    return insert_record
 
-def create_put_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
-    async def update_record(id: int, data: model):
+    async def insert_record(data: model, response: Response,
+                            return_fields: Optional[str] = Query(None, alias="return")):
         data_dict = data.dict(exclude_unset=True)
         if not data_dict:
-            raise HTTPException(status_code=400, detail="No fields provided for update")
-        if pk_name in data_dict:
-            data_dict.pop(pk_name)
-        if table_name == "Users" and "profile_image" in data_dict and data_dict["profile_image"]:
-            try:
-                data_dict["profile_image"] = base64.b64decode(data_dict["profile_image"])
-            except Exception as e:
-                raise HTTPException(status_code=400, detail="Invalid base64 for profile_image: " + str(e))
+            raise HTTPException(status_code=400, detail="No fields provided for insertion")
+        columns = parse_return_fields(table_name, pk_name, return_fields)
+        data_dict = await secure_write_data(table_name, prepare_write_data(table_name, pk_name, data_dict))
+        # ?return= needs the stored row, so those inserts always go straight to the database.
+        if table_name in WRITE_BEHIND_TABLES and return_fields is None:
+            await asyncio.to_thread(write_behind_queue.submit, INSERT, table_name, data_dict)
+            response.status_code = 202
+            return {"message": "Record accepted for insertion"}
+        result = await run_db(write_record, data_dict, return_fields is not None, columns)
+        if table_name == "Users" and data_dict.get("profile_image"):
+            pregenerate_thumbnails(data_dict["profile_image"])
+        return result
+    return insert_record
+
+def create_put_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
+    def write_update(id: int, data_dict: Dict[str, Any], returning: bool, columns: Optional[List[str]]):
         conn = get_db_connection()
         try:
-            cursor = conn.cursor()
-            updates = ", ".join([f"{col} = %s" for col in data_dict.keys()])
-            query = f"UPDATE {table_name} SET {updates} WHERE {pk_name} = %s"
+            cursor = conn.cursor(as_dict=True)
+            updates = ", ".join([f"{col} = %s" for col in data_dict.keys()] + touch_updated_at(table_name, data_dict))
+            counting = moves_counted_rows(table_name, data_dict)
+            unread_moving = moves_unread(table_name, data_dict)
+            extra = tuple(counter_output(table_name)) if counting else ()
+            if unread_moving:
+                extra += tuple(unread_output())
+            output = write_output(table_name, returning, columns, extra)
+            query = f"UPDATE {table_name} SET {updates}{' ' + output if output else ''} WHERE {pk_name} = %s"
             cursor.execute(query, tuple(data_dict.values()) + (id,))
+            record = cursor.fetchone() if output else None
+            if returning and not record:
+                raise HTTPException(status_code=404, detail="Record not found")
+            touched_posts, unread = [], {}
+            if counting and record:
+                touched_posts = update_post_counters(cursor, table_name, [pop_counter_values(record)])
+            if unread_moving and record:
+                unread = hold_unread([pop_unread_values(record)])
             conn.commit()
+            run_after_commit([(record_cache.invalidate, table_name, id), (invalidate_posts, touched_posts),
+                              (unread_counters.apply, unread)])
+            if returning:
+                return {"message": "Record updated successfully", "record": returned_record(table_name, record)}
             return {"message": "Record updated successfully"}
+        except HTTPException:
+            conn.rollback()
+            raise
         except Exception as e:
             conn.rollback()
             logging.error(f"Error updating record in {table_name}: {str(e)}")
             raise HTTPException(status_code=500, detail="Error updating record in " + table_name + ": " + str(e))
         finally:
             conn.close()
+
+    async def update_record(id: int, data: model, return_fields: Optional[str] = Query(None, alias="return")):
+        data_dict = data.dict(exclude_unset=True)
+        if not data_dict:
+            raise HTTPException(status_code=400, detail="No fields provided for update")
+        columns = parse_return_fields(table_name, pk_name, return_fields)
+        data_dict = await secure_write_data(table_name, prepare_write_data(table_name, pk_name, data_dict))
+        result = await run_db(write_update, id, data_dict, return_fields is not None, columns)
+        if table_name == "Users" and data_dict.get("profile_image"):
+            pregenerate_thumbnails(data_dict["profile_image"])
+        return result
     return update_record
 
 def create_delete_endpoint(table_name: str, pk_name: str):
-    async def delete_record(id: int):
+    def write_delete(id: int):
         conn = get_db_connection()
         try:
-            cursor = conn.cursor()
+            cursor = conn.cursor(as_dict=True)
+            counting = maintains_post_counters(table_name)
+            # The row's post_id and prior is_deleted come back so its post loses one count at most;
+            # likewise a notification's owner and read flag.
+            expressions = (counter_output(table_name, new=False) if counting else []) + \
+                (unread_output(new=False) if tracks_unread(table_name) else [])
+            output = f" OUTPUT {', '.join(expressions)}" if expressions else ""
             if table_name in soft_delete_tables:
-                query = f"UPDATE {table_name} SET is_deleted = 1 WHERE {pk_name} = %s"
+                updates = ", ".join(["is_deleted = 1"] + touch_updated_at(table_name))
+                query = f"UPDATE {table_name} SET {updates}{output} WHERE {pk_name} = %s"
                 cursor.execute(query, (id,))
             else:
-                query = f"DELETE FROM {table_name} WHERE {pk_name} = %s"
+                query = f"DELETE FROM {table_name}{output} WHERE {pk_name} = %s"
                 cursor.execute(query, (id,))
+            rows = cursor.fetchall() if output else []
+            touched_posts = update_post_counters(cursor, table_name, rows) if counting else []
+            unread = hold_unread(rows)
             conn.commit()
+            run_after_commit([(record_cache.invalidate, table_name, id), (invalidate_posts, touched_posts),
+                              (unread_counters.apply, unread)])
             return {"message": "Record deleted successfully"}
         except Exception as e:
             conn.rollback()
@@ -235,8 +1034,211 @@ def create_delete_endpoint(table_name: str, pk_name: str):
             raise HTTPException(status_code=500, detail="Error deleting record from " + table_name + ": " + str(e))
         finally:
             conn.close()
+
+    async def delete_record(id: int):
+        return await run_db(write_delete, id)
     return delete_record
 
+def create_bulk_insert_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
+    def insert_batch(cursor, columns: List[str], chunk: List[Tuple[int, Dict[str, Any]]],
+                     unread_rows: List[Dict[str, Any]]) -> List[int]:
+        output = f"OUTPUT {', '.join(unread_output(old=False))}" if tracks_unread(table_name) else ""
+        query = insert_values_sql(table_name, columns, len(chunk), output)
+        cursor.execute(query, tuple(row[col] for _, row in chunk for col in columns))
+        rows = cursor.fetchall() if output else []
+        touched_posts = []
+        if maintains_post_counters(table_name):
+            touched_posts = update_post_counters(cursor, table_name, [inserted_counter_row(row) for _, row in chunk])
+        unread_rows.extend(rows)
+        return touched_posts
+
+    def write_bulk(rows: List[Tuple[int, Dict[str, Any]]], batch_size: int, atomic: bool):
+        # Rows are grouped by column set so each group becomes multi-row INSERTs.
+        groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, row in rows:
+            groups.setdefault(tuple(row.keys()), []).append((index, row))
+        inserted, errors, touched_posts, unread_rows = 0, [], set(), []
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(as_dict=True)
+            for columns, group in groups.items():
+                columns = list(columns)
+                rows_per_statement = max(1, min(batch_size, SQL_SERVER_MAX_INSERT_ROWS,
+                                                SQL_SERVER_MAX_PARAMS // len(columns)))
+                for start in range(0, len(group), rows_per_statement):
+                    chunk = group[start:start + rows_per_statement]
+                    if atomic:
+                        touched_posts.update(insert_batch(cursor, columns, chunk, unread_rows))
+                        inserted += len(chunk)
+                        continue
+                    # Non-atomic: a failing batch is rolled back to its savepoint and
+                    # retried row by row so only the offending rows are rejected.
+                    cursor.execute("SAVE TRANSACTION bulk_batch")
+                    try:
+                        touched_posts.update(insert_batch(cursor, columns, chunk, unread_rows))
+                        inserted += len(chunk)
+                        continue
+                    except Exception:
+                        cursor.execute("ROLLBACK TRANSACTION bulk_batch")
+                    for index, row in chunk:
+                        cursor.execute("SAVE TRANSACTION bulk_row")
+                        try:
+                            touched_posts.update(insert_batch(cursor, columns, [(index, row)], unread_rows))
+                            inserted += 1
+                        except Exception as e:
+                            cursor.execute("ROLLBACK TRANSACTION bulk_row")
+                            errors.append({"index": index, "error": str(e)})
+            unread = hold_unread(unread_rows)
+            conn.commit()
+            run_after_commit([(invalidate_posts, list(touched_posts)), (unread_counters.apply, unread)])
+            return inserted, errors
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error bulk inserting into {table_name}: {str(e)}")
+            raise HTTPException(status_code=500, detail="Error bulk inserting into " + table_name + ": " + str(e))
+        finally:
+            conn.close()
+
+    async def bulk_insert_records(
+            rows: List[Dict[str, Any]] = Body(...),
+            batch_size: int = Query(BULK_INSERT_BATCH_SIZE, ge=1, le=SQL_SERVER_MAX_INSERT_ROWS),
+            atomic: bool = False,
+    ):
+        if len(rows) > BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per bulk request")
+        valid, errors = [], []
+        for index, row in enumerate(rows):
+            try:
+                data_dict = prepare_write_data(table_name, pk_name, model(**row).dict(exclude_unset=True))
+            except ValidationError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            except HTTPException as e:
+                errors.append({"index": index, "error": e.detail})
+                continue
+            if not data_dict:
+                errors.append({"index": index, "error": "No fields provided for insertion"})
+                continue
+            valid.append((index, data_dict))
+        if atomic and errors:
+            raise HTTPException(status_code=400, detail={"message": "No rows inserted", "errors": errors})
+        await secure_write_rows(table_name, [row for _, row in valid])
+        inserted, write_errors = await run_db(write_bulk, valid, batch_size, atomic) if valid else (0, [])
+        errors = sorted(errors + write_errors, key=lambda error: error["index"])
+        return {"message": f"Inserted {inserted} of {len(rows)} records", "inserted": inserted,
+                "failed": len(errors), "errors": errors}
+    return bulk_insert_records
+
+def create_bulk_update_endpoint(table_name: str, pk_name: str, model: Type[BaseModel]):
+    def write_bulk_update(selection: BulkSelection, data_dict: Dict[str, Any]) -> int:
+        conditions, filter_params = selection_conditions(table_name, pk_name, selection)
+        if table_name in soft_delete_tables:
+            conditions.append("is_deleted = 0")
+        updates = ", ".join([f"{col} = %s" for col in data_dict.keys()] + touch_updated_at(table_name, data_dict))
+        values = list(data_dict.values())
+        counting = moves_counted_rows(table_name, data_dict)
+        expressions = (counter_output(table_name) if counting else []) + \
+            (unread_output() if moves_unread(table_name, data_dict) else [])
+        output = f" OUTPUT {', '.join(expressions)}" if expressions else ""
+        affected, touched_posts, unread_rows = 0, [], []
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(as_dict=True)
+            for ids in id_chunks(selection.ids, len(values) + len(filter_params)):
+                where = list(conditions)
+                params = values + filter_params
+                if ids:
+                    where.append(f"{pk_name} IN ({', '.join(['%s'] * len(ids))})")
+                    params = params + ids
+                cursor.execute(f"UPDATE {table_name} SET {updates}{output} WHERE {' AND '.join(where)}", tuple(params))
+                if output:
+                    rows = cursor.fetchall()
+                    affected += len(rows)
+                    if counting:
+                        touched_posts.extend(update_post_counters(cursor, table_name, rows))
+                    unread_rows.extend(rows)
+                else:
+                    affected += cursor.rowcount
+            unread = hold_unread(unread_rows)
+            conn.commit()
+            run_after_commit([(invalidate_posts, touched_posts), (unread_counters.apply, unread)])
+            return affected
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error bulk updating {table_name}: {str(e)}")
+            raise HTTPException(status_code=500, detail="Error bulk updating " + table_name + ": " + str(e))
+        finally:
+            conn.close()
+            run_after_commit([(invalidate_selection, table_name, selection)])
+
+    async def bulk_update_records(request: BulkUpdateRequest):
+        try:
+            data_dict = model(**request.patch).dict(exclude_unset=True)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid patch: {str(e)}")
+        data_dict = await secure_write_data(table_name, prepare_write_data(table_name, pk_name, data_dict))
+        if not data_dict:
+            raise HTTPException(status_code=400, detail="No fields provided for update")
+        affected = await run_db(write_bulk_update, request, data_dict)
+        return {"message": f"Updated {affected} records", "affected": affected}
+    return bulk_update_records
+
+def create_bulk_delete_endpoint(table_name: str, pk_name: str):
+    def write_bulk_delete(selection: BulkSelection) -> int:
+        conditions, filter_params = selection_conditions(table_name, pk_name, selection)
+        if table_name in soft_delete_tables:
+            # Same semantics as DELETE /api/{table}/{id}: flag the rows, counting only ones not already deleted.
+            conditions.append("is_deleted = 0")
+            statement = f"UPDATE {table_name} SET {', '.join(['is_deleted = 1'] + touch_updated_at(table_name))}"
+        else:
+            statement = f"DELETE FROM {table_name}"
+        counting = maintains_post_counters(table_name)
+        expressions = (counter_output(table_name, new=False) if counting else []) + \
+            (unread_output(new=False) if tracks_unread(table_name) else [])
+        output = f" OUTPUT {', '.join(expressions)}" if expressions else ""
+        affected, touched_posts, unread_rows = 0, [], []
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(as_dict=True)
+            for ids in id_chunks(selection.ids, len(filter_params)):
+                where = list(conditions)
+                params = list(filter_params)
+                if ids:
+                    where.append(f"{pk_name} IN ({', '.join(['%s'] * len(ids))})")
+                    params.extend(ids)
+                cursor.execute(f"{statement}{output} WHERE {' AND '.join(where)}", tuple(params))
+                if output:
+                    rows = cursor.fetchall()
+                    affected += len(rows)
+                    if counting:
+                        touched_posts.extend(update_post_counters(cursor, table_name, rows))
+                    unread_rows.extend(rows)
+                else:
+                    affected += cursor.rowcount
+            unread = hold_unread(unread_rows)
+            conn.commit()
+            run_after_commit([(invalidate_posts, touched_posts), (unread_counters.apply, unread)])
+            return affected
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error bulk deleting from {table_name}: {str(e)}")
+            raise HTTPException(status_code=500, detail="Error bulk deleting from " + table_name + ": " + str(e))
+        finally:
+            conn.close()
+            run_after_commit([(invalidate_selection, table_name, selection)])
+
+    async def bulk_delete_records(selection: BulkSelection):
+        affected = await run_db(write_bulk_delete, selection)
+        return {"message": f"Deleted {affected} records", "affected": affected}
+    return bulk_delete_records
+
+def invalidate_selection(table_name: str, selection: BulkSelection):
+    if selection.filter or not selection.ids:
+        record_cache.invalidate_table(table_name)
+    else:
+        for id in selection.ids:
+            record_cache.invalidate(table_name, id)
+
 # ----------------------------------------------------------------------
 # REGISTER ALL ROUTES DYNAMICALLY
 # ----------------------------------------------------------------------
@@ -264,6 +1266,27 @@ for table_name, pk_name in tables.items():
         name=f"Insert record into {table_name}",
     )
 
+    app.add_api_route(
+        f"/api/{table_name}/bulk",
+        create_bulk_insert_endpoint(table_name, pk_name, model_class),
+        methods=["POST"],
+        name=f"Bulk insert records into {table_name}",
+    )
+
+    app.add_api_route(
+        f"/api/{table_name}/bulk",
+        create_bulk_update_endpoint(table_name, pk_name, model_class),
+        methods=["PATCH"],
+        name=f"Bulk update records in {table_name}",
+    )
+
+    app.add_api_route(
+        f"/api/{table_name}/bulk-delete",
+        create_bulk_delete_endpoint(table_name, pk_name),
+        methods=["POST"],
+        name=f"Bulk delete records from {table_name}",
+    )
+
     app.add_api_route(
         f"/api/{table_name}/{{id}}",
         create_put_endpoint(table_name, pk_name, model_class),
@@ -278,58 +1301,958 @@ for table_name, pk_name in tables.items():
         name=f"Delete record from {table_name}",
     )
 
+# ----------------------------------------------------------------------
+# WRITE-BEHIND – batched flushing of acknowledged inserts, and unlike by key
+# ----------------------------------------------------------------------
+LIKE_KEY = ("user_id", "post_id")
+
+class UnlikeModel(BaseModel):
+    user_id: int
+    post_id: int
+
+def apply_write_behind_run(cursor, run: List[Dict[str, Any]], after_commit: List[Tuple[Any, ...]]) -> int:
+    """Applies a run of same-shaped entries on the caller's transaction; returns the rows written."""
+    table_name, op = run[0]["table"], run[0]["op"]
+    pk_name = tables[table_name]
+    if op == INSERT:
+        columns = list(run[0]["data"].keys())
+        rows_per_statement = max(1, min(BULK_INSERT_BATCH_SIZE, SQL_SERVER_MAX_INSERT_ROWS,
+                                        SQL_SERVER_MAX_PARAMS // len(columns)))
+        publishing = table_name in REALTIME_RECIPIENTS
+        output = output_clause(table_name) if publishing or tracks_unread(table_name) else ""
+        for start in range(0, len(run), rows_per_statement):
+            chunk = [entry["data"] for entry in run[start:start + rows_per_statement]]
+            cursor.execute(insert_values_sql(table_name, columns, len(chunk), output),
+                           tuple(row[col] for row in chunk for col in columns))
+            records = cursor.fetchall() if output else []
+            if publishing:
+                after_commit.append((publish_inserted, table_name, records))
+            if tracks_unread(table_name):
+                after_commit.append((unread_counters.apply, hold_unread([inserted_unread_row(r) for r in records])))
+            if maintains_post_counters(table_name):
+                touched = update_post_counters(cursor, table_name, [inserted_counter_row(row) for row in chunk])
+                after_commit.append((invalidate_posts, touched))
+        return len(run)
+    output = [f"DELETED.{pk_name} AS {pk_name}"]
+    if maintains_post_counters(table_name):
+        output += counter_output(table_name, new=False)
+    if tracks_unread(table_name):
+        output += unread_output(new=False)
+    deleted = 0
+    for entry in run:
+        key = list(entry["data"].keys())
+        cursor.execute(
+            f"DELETE FROM {table_name} OUTPUT {', '.join(output)} WHERE {' AND '.join(f'{col} = %s' for col in key)}",
+            tuple(entry["data"].values()),
+        )
+        rows = cursor.fetchall()
+        if maintains_post_counters(table_name):
+            after_commit.append((invalidate_posts, update_post_counters(cursor, table_name, rows)))
+        if tracks_unread(table_name):
+            after_commit.append((unread_counters.apply, hold_unread(rows)))
+        for row in rows:
+            after_commit.append((record_cache.invalidate, table_name, row[pk_name]))
+        deleted += len(rows)
+    return deleted
+
+def flush_write_behind(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # A like and its unlike within the same window never reach the database.
+    entries = cancel_pairs(entries, "Likes", LIKE_KEY)
+    rejected, after_commit = [], []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        for run in entry_runs(entries):
+            # Same fallback as bulk insert: a failing run is retried entry by entry
+            # so only the offending entries are rejected.
+            cursor.execute("SAVE TRANSACTION write_behind_run")
+            # Callbacks are kept only for work that survives its savepoint.
+            run_callbacks = []
+            try:
+                apply_write_behind_run(cursor, run, run_callbacks)
+                after_commit.extend(run_callbacks)
+                continue
+            except Exception:
+                cursor.execute("ROLLBACK TRANSACTION write_behind_run")
+            for entry in run:
+                cursor.execute("SAVE TRANSACTION write_behind_entry")
+                entry_after_commit = []
+                try:
+                    apply_write_behind_run(cursor, [entry], entry_after_commit)
+                    after_commit.extend(entry_after_commit)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TRANSACTION write_behind_entry")
+                    rejected.append(dict(entry, error=str(e)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    # Past the commit the batch is done; a failing callback must not make the queue replay it.
+    run_after_commit(after_commit)
+    return rejected
+
+write_behind_queue = None
+if WRITE_BEHIND_TABLES:
+    write_behind_queue = WriteBehindQueue(WRITE_BEHIND_DIR, flush_write_behind, WRITE_BEHIND_MAX_BATCH,
+                                          WRITE_BEHIND_MAX_DELAY)
+    write_behind_queue.start()
+
+    @app.on_event("shutdown")
+    def flush_write_behind_on_shutdown():
+        write_behind_queue.close()
+
+def write_unlike(user_id: int, post_id: int) -> int:
+    after_commit = []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        deleted = apply_write_behind_run(cursor, [{"op": DELETE, "table": "Likes",
+                                                   "data": {"user_id": user_id, "post_id": post_id}}], after_commit)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error deleting like: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error deleting like: " + str(e))
+    finally:
+        conn.close()
+    run_after_commit(after_commit)
+    return deleted
+
+@app.post("/api/Likes/unlike")
+async def unlike_post(body: UnlikeModel, response: Response):
+    # Deletes by (user_id, post_id), so it can cancel a like still waiting in the write-behind log.
+    if "Likes" in WRITE_BEHIND_TABLES:
+        await asyncio.to_thread(write_behind_queue.submit, DELETE, "Likes", body.dict())
+        response.status_code = 202
+        return {"message": "Unlike accepted"}
+    deleted = await run_db(write_unlike, body.user_id, body.post_id)
+    return {"message": "Like removed" if deleted else "No like found", "deleted": deleted}
+
+# ----------------------------------------------------------------------
+# FEED – newest posts with author, counts and the viewer's like, paged by post_id
+# ----------------------------------------------------------------------
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# One set-based query per page. Authors with hide_info show only their
+# anonymous_name; their id, username and avatar are blanked in SQL, so the
+# author's user_id is not selected on its own. Counts are the denormalized
+# Posts columns once they exist (see reconcile-counters); until then they are
+# counted through OUTER APPLY, which seeks Likes/Comments by post_id.
+FEED_COUNT_JOINS = """
+    OUTER APPLY (SELECT COUNT(*) AS like_count FROM Likes l WHERE l.post_id = p.post_id) lc
+    OUTER APPLY (
+        SELECT COUNT(*) AS comment_count FROM Comments c WHERE c.post_id = p.post_id AND c.is_deleted = 0
+    ) cc"""
+
+FEED_QUERY = """
+    SELECT TOP ({top})
+        p.post_id, p.content, p.image_url, p.created_at, p.updated_at,
+        CASE WHEN u.hide_info = 1 THEN NULL ELSE p.user_id END AS author_id,
+        CASE WHEN u.hide_info = 1 THEN u.anonymous_name ELSE u.name END AS author_name,
+        CASE WHEN u.hide_info = 1 THEN NULL ELSE u.username END AS author_username,
+        CASE WHEN u.hide_info = 1 THEN NULL ELSE {image_hash} END AS author_image_hash,
+        u.hide_info AS author_hidden,
+        {counts},
+        CASE WHEN EXISTS (
+            SELECT 1 FROM Likes vl WHERE vl.post_id = p.post_id AND vl.user_id = %s
+        ) THEN 1 ELSE 0 END AS viewer_liked
+    FROM Posts p
+    JOIN Users u ON u.user_id = p.user_id AND u.is_deleted = 0{count_joins}
+    WHERE p.is_deleted = 0{before}
+    ORDER BY p.post_id DESC
+"""
+
+def fetch_feed(viewer_id: Optional[int], limit: int, before: Optional[int]):
+    stored_counts = all(col in column_names("Posts") for col in COUNTER_COLUMNS)
+    query = FEED_QUERY.format(
+        top=limit + 1,
+        counts="p.like_count, p.comment_count" if stored_counts else "lc.like_count, cc.comment_count",
+        count_joins="" if stored_counts else FEED_COUNT_JOINS,
+        image_hash=PROFILE_IMAGE_HASH_SQL.format(column="u.profile_image"),
+        before=" AND p.post_id < %s" if before is not None else "",
+    )
+    params = (viewer_id,) + ((before,) if before is not None else ())
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error loading feed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+    posts = []
+    for post in rows[:limit]:
+        post["author_hidden"] = bool(post["author_hidden"])
+        post["viewer_liked"] = bool(post["viewer_liked"])
+        digest = post.pop("author_image_hash")
+        post["author_image_url"] = profile_image_url(post["author_id"], digest) if digest else None
+        posts.append(post)
+    next_before = posts[-1]["post_id"] if len(rows) > limit else None
+    return {"posts": posts, "next_before": next_before}
+
+@app.get("/api/feed")
+async def get_feed(
+        viewer_id: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+):
+    # Newest first; pass next_before back as ?before= for the next page.
+    return await run_db(fetch_feed, viewer_id, limit, before)
+
+# ----------------------------------------------------------------------
+# CONVERSATIONS – chat list and per-pair history over Messages
+# ----------------------------------------------------------------------
+# Both endpoints seek on (sender_id, receiver_id) and (receiver_id, sender_id)
+# ordered by message_id; `python -m app.main create-indexes` creates these.
+MESSAGE_INDEXES = {
+    "IX_Messages_sender_receiver":
+        "CREATE INDEX IX_Messages_sender_receiver ON Messages (sender_id, receiver_id, message_id DESC) "
+        "WHERE is_deleted = 0",
+    "IX_Messages_receiver_sender":
+        "CREATE INDEX IX_Messages_receiver_sender ON Messages (receiver_id, sender_id, message_id DESC) "
+        "INCLUDE (is_read) WHERE is_deleted = 0",
+}
+
+MESSAGE_COLUMNS = "message_id, sender_id, receiver_id, content, is_read, created_at, updated_at"
+
+def create_message_indexes(conn) -> List[str]:
+    created = []
+    cursor = conn.cursor()
+    for name, ddl in MESSAGE_INDEXES.items():
+        cursor.execute(
+            f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = %s AND object_id = OBJECT_ID('Messages')) {ddl}",
+            (name,),
+        )
+        created.append(name)
+    conn.commit()
+    return created
+
+def fetch_conversations(user_id: int, limit: int, before: Optional[int]):
+    # Latest message per partner from two index seeks (sent and received), newest conversation first.
+    before_condition = " WHERE l.last_message_id < %s" if before is not None else ""
+    query = f"""
+        WITH mine AS (
+            SELECT message_id, receiver_id AS partner_id FROM Messages
+            WHERE sender_id = %s AND is_deleted = 0
+            UNION ALL
+            SELECT message_id, sender_id AS partner_id FROM Messages
+            WHERE receiver_id = %s AND sender_id <> %s AND is_deleted = 0
+        ), latest AS (
+            SELECT partner_id, MAX(message_id) AS last_message_id FROM mine GROUP BY partner_id
+        )
+        SELECT TOP ({limit + 1})
+            l.partner_id,
+            CASE WHEN p.hide_info = 1 THEN p.anonymous_name ELSE p.name END AS partner_name,
+            CASE WHEN p.hide_info = 1 THEN NULL ELSE p.username END AS partner_username,
+            m.message_id, m.sender_id, m.receiver_id, m.content, m.is_read, m.created_at,
+            (SELECT COUNT(*) FROM Messages u
+             WHERE u.receiver_id = %s AND u.sender_id = l.partner_id AND u.is_read = 0 AND u.is_deleted = 0
+            ) AS unread_count
+        FROM latest l
+        JOIN Messages m ON m.message_id = l.last_message_id
+        LEFT JOIN Users p ON p.user_id = l.partner_id{before_condition}
+        ORDER BY l.last_message_id DESC
+    """
+    params = (user_id, user_id, user_id, user_id) + ((before,) if before is not None else ())
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error loading conversations for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+    conversations = [
+        {
+            "partner_id": row["partner_id"],
+            "partner_name": row["partner_name"],
+            "partner_username": row["partner_username"],
+            "unread_count": row["unread_count"],
+            "last_message": {key: row[key] for key in
+                             ("message_id", "sender_id", "receiver_id", "content", "is_read", "created_at")},
+        }
+        for row in rows[:limit]
+    ]
+    next_before = conversations[-1]["last_message"]["message_id"] if len(rows) > limit else None
+    return {"conversations": conversations, "next_before": next_before}
+
+def fetch_message_history(user_id: int, other_user_id: int, limit: int, before: Optional[int]):
+    # Each direction is a TOP (limit + 1) seek; the union is cut back to one page.
+    before_condition = " AND message_id < %s" if before is not None else ""
+    directions = [(user_id, other_user_id)] if user_id == other_user_id else \
+        [(user_id, other_user_id), (other_user_id, user_id)]
+    branches, params = [], []
+    for sender_id, receiver_id in directions:
+        branches.append(
+            f"SELECT * FROM (SELECT TOP ({limit + 1}) {MESSAGE_COLUMNS} FROM Messages "
+            f"WHERE sender_id = %s AND receiver_id = %s AND is_deleted = 0{before_condition} "
+            f"ORDER BY message_id DESC) AS direction_{len(branches)}"
+        )
+        params.extend([sender_id, receiver_id] + ([before] if before is not None else []))
+    query = f"SELECT TOP ({limit + 1}) * FROM ({' UNION ALL '.join(branches)}) AS history ORDER BY message_id DESC"
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+    except Exception as e:
+        logging.error(f"Error loading messages between {user_id} and {other_user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+    messages = rows[:limit]
+    next_before = messages[-1]["message_id"] if len(rows) > limit else None
+    return {"messages": messages, "next_before": next_before}
+
+@app.get("/api/conversations")
+async def get_conversations(
+        user_id: int,
+        before: Optional[int] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    return await run_db(fetch_conversations, user_id, limit, before)
+
+@app.get("/api/conversations/{user_id}/{other_user_id}")
+async def get_message_history(
+        user_id: int,
+        other_user_id: int,
+        before: Optional[int] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    # Newest first; pass next_before back as ?before= to page towards older messages.
+    return await run_db(fetch_message_history, user_id, other_user_id, limit, before)
+
+# ----------------------------------------------------------------------
+# REALTIME EVENTS – server-sent events for new Messages and Notifications
+# ----------------------------------------------------------------------
+def fetch_realtime_watermarks(user_id: int) -> Dict[str, int]:
+    # The newest id per table addressed to the user, i.e. where a fresh stream starts.
+    selects = ", ".join(
+        f"(SELECT ISNULL(MAX({tables[table_name]}), 0) FROM {table_name} WHERE {column} = %s) AS {table_name}"
+        for table_name, column in REALTIME_RECIPIENTS.items()
+    )
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(f"SELECT {selects}", (user_id,) * len(REALTIME_RECIPIENTS))
+        return dict(cursor.fetchone())
+    finally:
+        conn.close()
+
+def fetch_realtime_backlog(user_id: int, watermarks: Dict[str, int], limit: int):
+    """Rows addressed to the user after the given watermarks, oldest first; flags tables with more than ``limit``."""
+    events, truncated = [], []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        for table_name, column in REALTIME_RECIPIENTS.items():
+            pk_name = tables[table_name]
+            live = " AND is_deleted = 0" if table_name in soft_delete_tables else ""
+            cursor.execute(
+                f"SELECT TOP ({limit + 1}) * FROM {table_name} WHERE {column} = %s AND {pk_name} > %s{live} "
+                f"ORDER BY {pk_name}",
+                (user_id, watermarks[table_name]),
+            )
+            rows = cursor.fetchall()
+            if len(rows) > limit:
+                truncated.append(table_name)
+            events.extend({"table": table_name, "id": row[pk_name], "record": row} for row in rows[:limit])
+    finally:
+        conn.close()
+    return events, truncated
+
+async def realtime_catch_up(user_id: int, watermarks: Dict[str, int]):
+    # A backlog too large to replay is skipped: the client is told to reload over REST.
+    events, truncated = await run_db(fetch_realtime_backlog, user_id, watermarks, REALTIME_CATCHUP_LIMIT)
+    if truncated:
+        return [], await run_db(fetch_realtime_watermarks, user_id), truncated
+    return events, watermarks, []
+
+async def realtime_stream(request: Request, user_id: int, subscription, watermarks: Dict[str, int],
+                          backlog: List[Dict[str, Any]], truncated: List[str]):
+    # Recently sent ids per table, so catch-up and live delivery never repeat an event.
+    sent: Dict[str, Any] = {table_name: deque(maxlen=REALTIME_QUEUE_SIZE * 4) for table_name in REALTIME_RECIPIENTS}
+    try:
+        if truncated:
+            yield sse_message({"tables": truncated}, event="resync", event_id=encode_event_id(watermarks))
+        yield sse_message({"user_id": user_id}, event="ready", event_id=encode_event_id(watermarks))
+        events = backlog
+        while True:
+            for event in events:
+                table_name = event["table"]
+                if event["id"] in sent[table_name]:
+                    continue
+                sent[table_name].append(event["id"])
+                watermarks[table_name] = max(watermarks[table_name], event["id"])
+                yield sse_message(event["record"], event=table_name, event_id=encode_event_id(watermarks))
+            if await request.is_disconnected():
+                break
+            events = await subscription.next_batch(REALTIME_KEEPALIVE_SECONDS)
+            if subscription.lagged:
+                # Events were dropped for this slow reader; refill from the database instead.
+                subscription.lagged = False
+                events, watermarks, truncated = await realtime_catch_up(user_id, watermarks)
+                if truncated:
+                    yield sse_message({"tables": truncated}, event="resync", event_id=encode_event_id(watermarks))
+            elif not events:
+                yield SSE_KEEPALIVE
+    finally:
+        realtime_broker.unsubscribe(subscription)
+
+@app.get("/api/events/{user_id}")
+async def stream_events(user_id: int, request: Request, last_event_id: Optional[str] = None,
+                        current_user: Dict[str, Any] = Depends(get_current_user)):
+    if current_user["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Cannot subscribe to another user's events")
+    resume = decode_event_id(request.headers.get("Last-Event-ID") or last_event_id, list(REALTIME_RECIPIENTS))
+    # Subscribe before reading the database so nothing committed in between is missed.
+    subscription = realtime_broker.subscribe(user_channel(user_id), asyncio.get_running_loop(), REALTIME_QUEUE_SIZE)
+    try:
+        if resume is None:
+            watermarks, backlog, truncated = await run_db(fetch_realtime_watermarks, user_id), [], []
+        else:
+            backlog, watermarks, truncated = await realtime_catch_up(user_id, resume)
+    except Exception:
+        realtime_broker.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        realtime_stream(request, user_id, subscription, watermarks, backlog, truncated),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ----------------------------------------------------------------------
+# UNREAD NOTIFICATIONS – cached per-user badge count
+# ----------------------------------------------------------------------
+def count_unread_notifications(user_id: int) -> int:
+    count = unread_counters.get(user_id)
+    if count is not None:
+        return count
+    token = unread_counters.begin_rebuild(user_id)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(COUNT_UNREAD_SQL, (user_id,))
+        count = cursor.fetchone()["unread"]
+        return count
+    except Exception as e:
+        logging.error(f"Error counting unread notifications: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error counting unread notifications: " + str(e))
+    finally:
+        conn.close()
+        unread_counters.end_rebuild(user_id, token, count)
+
+@app.get("/api/unread-notifications/{user_id}")
+async def get_unread_notifications(user_id: int):
+    return {"user_id": user_id, "unread": await run_db(count_unread_notifications, user_id)}
+
 # ----------------------------------------------------------------------
 # ALL-DATA ENDPOINT
 # ----------------------------------------------------------------------
-@app.get("/api/all-data")
-async def get_all_data():
+def fetch_table_rows(table_name: str, row_limit: Optional[int], projections: Dict[str, Optional[List[str]]]):
+    columns = projections.get(table_name)
     conn = get_db_connection()
-    all_data = {}
     try:
-        for table_name in tables.keys():
-            cursor = conn.cursor(as_dict=True)
-            if table_name in soft_delete_tables:
-                query = f"SELECT * FROM {table_name} WHERE is_deleted = 0"
+        cursor = conn.cursor(as_dict=True)
+        if row_limit is None:
+            cursor.execute(select_all_query(table_name, columns=columns))
+        else:
+            # One extra row tells us whether the table was cut off.
+            cursor.execute(f"{select_all_query(table_name, row_limit + 1, columns)} ORDER BY {tables[table_name]}")
+        rows = cursor.fetchall()
+        truncated = row_limit is not None and len(rows) > row_limit
+        if truncated:
+            rows = rows[:row_limit]
+        if table_name == "Users":
+            rows = [clean_users_record(row) for row in rows]
+        return rows, truncated
+    except Exception as e:
+        logging.error(f"Error in all-data endpoint for {table_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+
+def change_tracking_column(table_name: str) -> Optional[Tuple[str, str]]:
+    # Prefer a rowversion column, which is exact; otherwise updated_at. created_at
+    # alone would miss updates, so such tables are untracked and always sent in full
+    # (see add-rowversion).
+    columns = get_table_columns(table_name)
+    for col_name, data_type in columns:
+        if is_rowversion_type(data_type):
+            return col_name, "rowversion"
+    if "updated_at" in [col_name for col_name, _ in columns]:
+        return "updated_at", "datetime"
+    return None
+
+def untracked_tables(selected: List[str]) -> List[str]:
+    return [table_name for table_name in selected if change_tracking_column(table_name) is None]
+
+def ensure_rowversion_columns(conn, table_names: Tuple[str, ...] = SYNC_ROWVERSION_TABLES) -> List[str]:
+    # SQL Server allows one rowversion column per table, so tables that have one keep it.
+    added = []
+    cursor = conn.cursor()
+    for table_name in table_names:
+        tracking = change_tracking_column(table_name)
+        if tracking is not None and tracking[1] == "rowversion":
+            continue
+        cursor.execute(
+            f"IF NOT EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('{table_name}') "
+            f"AND system_type_id = TYPE_ID('timestamp')) "
+            f"ALTER TABLE {table_name} ADD {SYNC_ROWVERSION_COLUMN} ROWVERSION"
+        )
+        added.append(table_name)
+    conn.commit()
+    return added
+
+if untracked_tables(list(tables)):
+    logging.warning(f"Delta sync resends these tables in full: {', '.join(untracked_tables(list(tables)))}; "
+                    f"see `python -m app.main add-rowversion`")
+
+def fetch_sync_clock():
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute("SELECT GETDATE() AS server_time, MIN_ACTIVE_ROWVERSION() AS min_rowversion")
+        return cursor.fetchone()
+    except Exception as e:
+        logging.error(f"Error reading the sync clock: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+
+def fetch_table_delta(table_name: str, watermarks: Dict[str, Any], projections: Dict[str, Optional[List[str]]]):
+    pk_name = tables[table_name]
+    previous = watermarks.get(table_name)
+    tracking = change_tracking_column(table_name)
+    columns = projections.get(table_name)
+    if columns is not None:
+        # Deletions are recognised by primary key and the soft-delete flag.
+        extra = ["is_deleted"] if table_name in soft_delete_tables else []
+        columns = list(dict.fromkeys(columns + extra))
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        if tracking is not None and previous is not None and previous.get("c") == tracking[0]:
+            col_name, kind = tracking
+            if kind == "rowversion":
+                watermark = bytes.fromhex(previous["w"])
             else:
-                query = f"SELECT * FROM {table_name}"
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            if table_name == "Users":
-                rows = [clean_users_record(row) for row in rows]
-            all_data[table_name] = rows if rows else []
-        return all_data
+                watermark = previous["w"] - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            cursor.execute(f"SELECT {select_columns(table_name, columns)} FROM {table_name} WHERE {col_name} >= %s", (watermark,))
+            full = False
+        else:
+            # No usable watermark for this table: send everything once.
+            cursor.execute(select_all_query(table_name, columns=columns))
+            full = True
+        upserted, deleted = [], []
+        for row in cursor.fetchall():
+            if row.get("is_deleted"):
+                deleted.append(row[pk_name])
+                continue
+            upserted.append(clean_users_record(row) if table_name == "Users" else row)
+        return {"full": full, "upserted": upserted, "deleted": deleted}
     except Exception as e:
-        logging.error(f"Error in all-data endpoint: {str(e)}")
+        logging.error(f"Error in all-data delta sync for {table_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         conn.close()
 
+async def gather_tables(selected: List[str], fn, *args) -> Dict[str, Any]:
+    # Each table is read on its own pooled connection, a few at a time so one
+    # request cannot take the whole pool.
+    limiter = asyncio.Semaphore(ALL_DATA_PARALLELISM)
+
+    async def fetch(table_name: str):
+        async with limiter:
+            return await run_db(fn, table_name, *args)
+
+    results = await asyncio.gather(*(fetch(table_name) for table_name in selected))
+    return dict(zip(selected, results))
+
+async def stream_all_data_sections(selected: List[str], projections: Dict[str, Optional[List[str]]],
+                                   row_limit: Optional[int] = None):
+    # Capped tables are cut the same way as in fetch_table_rows; a stream cannot set
+    # X-Truncated-Tables after it starts, so a table with row_limit rows may have more.
+    for table_name in selected:
+        yield table_name, []
+        columns = projections.get(table_name)
+        if row_limit is None:
+            query = select_all_query(table_name, columns=columns)
+        else:
+            query = f"{select_all_query(table_name, row_limit, columns)} ORDER BY {tables[table_name]}"
+        async for rows in stream_row_batches(table_name, query):
+            yield table_name, rows
+
+def parse_table_filter(table_filter: Optional[str]) -> List[str]:
+    if not table_filter:
+        return list(tables.keys())
+    selected = [name.strip() for name in table_filter.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in tables]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid table name(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(selected))
+
+@app.get("/api/all-data")
+async def get_all_data(
+        response: Response,
+        stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+        delta: bool = False,
+        since: Optional[str] = None,
+        table_filter: Optional[str] = Query(None, alias="tables"),
+        limit_per_table: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE * 10),
+        fields: Optional[str] = None,
+):
+    selected = parse_table_filter(table_filter)
+    projections = parse_table_fields(fields, selected)
+    # Delta mode: ?delta=true starts a sync, ?since=<sync_token> continues one.
+    if delta or since:
+        if limit_per_table is not None:
+            # A capped delta would move the watermark past rows it never sent.
+            raise HTTPException(status_code=400, detail="limit_per_table cannot be combined with delta sync")
+        watermarks = {}
+        if since:
+            try:
+                token = decode_cursor(since)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Malformed sync token")
+            if token.get("v") != SYNC_TOKEN_VERSION:
+                raise HTTPException(status_code=410, detail="Sync token is no longer supported; start a full sync")
+            watermarks = token.get("t", {})
+        # Read the clock before the tables so nothing written meanwhile falls between tokens.
+        clock = await run_db(fetch_sync_clock)
+        changes = await gather_tables(selected, fetch_table_delta, watermarks, projections)
+        new_watermarks = dict(watermarks)
+        for table_name in selected:
+            tracking = change_tracking_column(table_name)
+            if tracking is not None:
+                col_name, kind = tracking
+                value = clock["min_rowversion"].hex() if kind == "rowversion" else clock["server_time"]
+                new_watermarks[table_name] = {"c": col_name, "w": value}
+            else:
+                new_watermarks.pop(table_name, None)
+        return {
+            "sync_token": encode_cursor({"v": SYNC_TOKEN_VERSION, "t": new_watermarks}),
+            "changes": changes,
+            # Tables with neither rowversion nor updated_at come back with full=true every time.
+            "untracked_tables": untracked_tables(selected),
+        }
+    if stream == "ndjson":
+        return streaming_response(
+            tagged_ndjson_chunks(stream_all_data_sections(selected, projections, limit_per_table)), stream)
+    if stream == "json":
+        return streaming_response(
+            json_object_chunks(stream_all_data_sections(selected, projections, limit_per_table)), stream)
+    results = await gather_tables(selected, fetch_table_rows, limit_per_table, projections)
+    truncated = [table_name for table_name, (_, cut) in results.items() if cut]
+    if truncated:
+        response.headers["X-Truncated-Tables"] = ",".join(truncated)
+    return {table_name: rows for table_name, (rows, _) in results.items()}
+
 # ----------------------------------------------------------------------
-# TABLE FIELDS ENDPOINT
+# BATCH ENDPOINT – many CRUD operations on one connection and transaction
 # ----------------------------------------------------------------------
-@app.get("/api/fields/{table_name}")
-async def get_table_fields(table_name: str):
-    if table_name not in tables:
-        raise HTTPException(status_code=400, detail="Invalid table name.")
+class BatchOperation(BaseModel):
+    op: str
+    table: str
+    id: Optional[Any] = None
+    data: Optional[Dict[str, Any]] = None
+    ref: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    atomic: bool = True
+    operations: List[BatchOperation]
+
+class BatchOperationError(Exception):
+    pass
+
+BATCH_OPERATIONS = ("get", "insert", "update", "delete")
+
+# "$<ref>.<column>" stands for a column of the record returned by an earlier operation
+BATCH_REFERENCE = re.compile(r"^\$([A-Za-z_]\w*)\.(\w+)$")
+
+def resolve_batch_value(value: Any, records: Dict[str, Dict[str, Any]]) -> Any:
+    if not isinstance(value, str):
+        return value
+    match = BATCH_REFERENCE.match(value)
+    if not match:
+        return value
+    ref, column = match.groups()
+    if ref not in records:
+        raise BatchOperationError(f"Reference '{ref}' is not available")
+    if column not in records[ref]:
+        raise BatchOperationError(f"Reference '{ref}' has no column '{column}'")
+    return records[ref][column]
+
+def batch_write_data(table_name: str, pk_name: str, data: Optional[Dict[str, Any]],
+                     records: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    data = {col: resolve_batch_value(value, records) for col, value in (data or {}).items()}
+    try:
+        data_dict = table_models[table_name](**data).dict(exclude_unset=True)
+        data_dict = prepare_write_data(table_name, pk_name, data_dict)
+    except ValidationError as e:
+        raise BatchOperationError(str(e))
+    except HTTPException as e:
+        raise BatchOperationError(e.detail)
+    if not data_dict:
+        raise BatchOperationError("No fields provided")
+    # Literal passwords were hashed by run_batch; only a referenced value can still be plaintext.
+    if needs_password_hash(table_name, data_dict):
+        raise BatchOperationError("password_hash cannot be taken from a reference")
+    return data_dict
+
+def execute_batch_operation(cursor, operation: BatchOperation, records: Dict[str, Dict[str, Any]],
+                            after_commit: List[Tuple[Any, ...]]) -> Dict[str, Any]:
+    table_name = operation.table
+    pk_name = tables[table_name]
+    id = resolve_batch_value(operation.id, records)
+    if operation.op != "insert" and id is None:
+        raise BatchOperationError(f"'{operation.op}' needs an id")
+    counter_rows = None
+    if operation.op == "get":
+        query = f"SELECT {select_columns(table_name)} FROM {table_name} WHERE {pk_name} = %s"
+        if table_name in soft_delete_tables:
+            query += " AND is_deleted = 0"
+        cursor.execute(query, (id,))
+    elif operation.op == "insert":
+        data_dict = batch_write_data(table_name, pk_name, operation.data, records)
+        query = insert_values_sql(table_name, list(data_dict.keys()), 1, output_clause(table_name))
+        cursor.execute(query, tuple(data_dict.values()))
+        if maintains_post_counters(table_name):
+            counter_rows = [inserted_counter_row(data_dict)]
+        if table_name == "Users" and data_dict.get("profile_image"):
+            after_commit.append((pregenerate_thumbnails, data_dict["profile_image"]))
+    elif operation.op == "update":
+        data_dict = batch_write_data(table_name, pk_name, operation.data, records)
+        updates = ", ".join([f"{col} = %s" for col in data_dict.keys()] + touch_updated_at(table_name, data_dict))
+        extra = tuple(counter_output(table_name)) if moves_counted_rows(table_name, data_dict) else ()
+        if moves_unread(table_name, data_dict):
+            extra += tuple(unread_output())
+        query = f"UPDATE {table_name} SET {updates} {output_clause(table_name, extra=extra)} WHERE {pk_name} = %s"
+        cursor.execute(query, tuple(data_dict.values()) + (id,))
+        counter_rows = [] if extra else None
+        after_commit.append((record_cache.invalidate, table_name, id))
+        if table_name == "Users" and data_dict.get("profile_image"):
+            after_commit.append((pregenerate_thumbnails, data_dict["profile_image"]))
+    else:
+        output = [f"DELETED.{pk_name} AS {pk_name}"]
+        if maintains_post_counters(table_name):
+            output += counter_output(table_name, new=False)
+            counter_rows = []
+        if tracks_unread(table_name):
+            output += unread_output(new=False)
+        if table_name in soft_delete_tables:
+            updates = ", ".join(["is_deleted = 1"] + touch_updated_at(table_name))
+            query = f"UPDATE {table_name} SET {updates} OUTPUT {', '.join(output)} WHERE {pk_name} = %s"
+        else:
+            query = f"DELETE FROM {table_name} OUTPUT {', '.join(output)} WHERE {pk_name} = %s"
+        cursor.execute(query, (id,))
+        after_commit.append((record_cache.invalidate, table_name, id))
+    record = cursor.fetchone()
+    if not record:
+        raise BatchOperationError("Record not found")
+    if counter_rows is not None:
+        # Inserts know their counted row up front; updates and deletes read it from OUTPUT.
+        counter_rows = counter_rows or [pop_counter_values(record)]
+        after_commit.append((invalidate_posts, update_post_counters(cursor, table_name, counter_rows)))
+    if tracks_unread(table_name) and operation.op != "get":
+        unread_row = inserted_unread_row(record) if operation.op == "insert" else pop_unread_values(record)
+        after_commit.append((unread_counters.apply, hold_unread([unread_row])))
+    if operation.op == "insert":
+        after_commit.append((publish_inserted, table_name, [dict(record)]))
+    return returned_record(table_name, record)
+
+def execute_batch(request: BatchRequest) -> Dict[str, Any]:
+    records: Dict[str, Dict[str, Any]] = {}
+    results, after_commit = [], []
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        query = """
-            SELECT COLUMN_NAME, DATA_TYPE
-            FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_NAME = %s
-            ORDER BY ORDINAL_POSITION
+        cursor = conn.cursor(as_dict=True)
+        for index, operation in enumerate(request.operations):
+            result = {"index": index, "op": operation.op, "table": operation.table}
+            if not request.atomic:
+                # Non-atomic: each operation has its own savepoint, so a failure only undoes itself.
+                cursor.execute("SAVE TRANSACTION batch_op")
+            try:
+                record = execute_batch_operation(cursor, operation, records, after_commit)
+            except Exception as e:
+                error = str(e)
+                if request.atomic:
+                    conn.rollback()
+                    raise HTTPException(status_code=400, detail={
+                        "message": "Batch rolled back; no operations were applied",
+                        "index": index, "error": error,
+                    })
+                cursor.execute("ROLLBACK TRANSACTION batch_op")
+                results.append(dict(result, status="error", error=error))
+                continue
+            if operation.ref:
+                records[operation.ref] = record
+            results.append(dict(result, status="ok", record=record))
+        conn.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error executing batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error executing batch: " + str(e))
+    finally:
+        conn.close()
+    # Cache and counter updates run before the response, like every other write path;
+    # pregenerate_thumbnails only queues its rendering on the thumbnail pool.
+    run_after_commit(after_commit)
+    failed = sum(1 for result in results if result["status"] == "error")
+    return {"committed": True, "succeeded": len(results) - failed, "failed": failed, "results": results}
+
+@app.post("/api/batch")
+async def run_batch(request: BatchRequest):
+    if not request.operations:
+        raise HTTPException(status_code=400, detail="No operations provided")
+    if len(request.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    for index, operation in enumerate(request.operations):
+        if operation.table not in tables:
+            raise HTTPException(status_code=400, detail=f"Operation {index}: unknown table '{operation.table}'")
+        if operation.op not in BATCH_OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"Operation {index}: op must be one of {', '.join(BATCH_OPERATIONS)}")
+    # Literal passwords are hashed here, before execute_batch opens its transaction.
+    await secure_write_rows("Users", [
+        operation.data for operation in request.operations
+        if operation.table == "Users" and operation.data and isinstance(operation.data.get("password_hash"), str)
+        and not BATCH_REFERENCE.match(operation.data["password_hash"])
+    ])
+    return await run_db(execute_batch, request)
+
+# ----------------------------------------------------------------------
+# PROFILE IMAGE ENDPOINT – raw bytes with a content-hash ETag
+# ----------------------------------------------------------------------
+def fetch_profile_image(user_id: int, cached_digest: Optional[str], include_image: bool = True):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        image_hash = PROFILE_IMAGE_HASH_SQL.format(column="profile_image")
+        if include_image:
+            # The blob is only sent back when the client's copy is out of date.
+            image = f"CASE WHEN {image_hash} = %s THEN NULL ELSE profile_image END"
+            params = (cached_digest or "", user_id)
+        else:
+            image = "NULL"
+            params = (user_id,)
+        query = f"""
+            SELECT {image_hash} AS profile_image_hash, {image} AS profile_image
+            FROM Users
+            WHERE user_id = %s AND is_deleted = 0
         """
-        cursor.execute(query, (table_name,))
-        columns = cursor.fetchall()
-        result = [{"column_name": row[0], "data_type": row[1]} for row in columns]
-        return result
+        cursor.execute(query, params)
+        return cursor.fetchone()
     except Exception as e:
-        logging.error(f"Error getting fields for {table_name}: {str(e)}")
+        logging.error(f"Error fetching profile image for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         conn.close()
 
+async def load_profile_image_variant(user_id: int, size: int, if_none_match: Optional[str]):
+    # Only the hash is read up front; the original is fetched solely to render a missing
+    # variant. Database reads go through run_db, thumbnail reads and renders through the
+    # thumbnail pool.
+    row = await run_db(fetch_profile_image, user_id, None, False)
+    if not row or not row["profile_image_hash"]:
+        return row
+    digest = row["profile_image_hash"]
+    if etag_matches(if_none_match, image_etag(digest, str(size))):
+        return row
+    variant = await run_thumbnail_work(thumbnail_store.get, digest, size)
+    if variant is None:
+        original = await run_db(fetch_profile_image, user_id, None)
+        image = original["profile_image"] if original else None
+        if image:
+            variant = await run_thumbnail_work(thumbnail_store.get_or_render, digest, size, lambda: image)
+        if variant is None:
+            # No Pillow or an undecodable image: fall back to the original bytes.
+            row["profile_image"] = image
+            return row
+    row["profile_image"] = variant
+    row["variant"] = size
+    return row
+
+def digest_from_etag(if_none_match: Optional[str]) -> Optional[str]:
+    for candidate in (if_none_match or "").split(","):
+        digest = candidate.strip().removeprefix("W/").strip('"')
+        if len(digest) == 64:
+            return digest.lower()
+    return None
+
+@app.get("/api/Users/{id}/profile-image")
+async def get_profile_image(id: int, request: Request, v: Optional[str] = None, size: Optional[int] = None):
+    if size is not None and size not in thumbnail_store.sizes:
+        raise HTTPException(status_code=400, detail=f"Unsupported size; available sizes: {list(thumbnail_store.sizes)}")
+    if_none_match = request.headers.get("if-none-match")
+    if size is None:
+        row = await run_db(fetch_profile_image, id, digest_from_etag(if_none_match))
+    else:
+        row = await load_profile_image_variant(id, size, if_none_match)
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    digest = row["profile_image_hash"]
+    if not digest:
+        raise HTTPException(status_code=404, detail="User has no profile image")
+    variant = row.get("variant")
+    etag = image_etag(digest, str(size) if size is not None else None)
+    # Only the exact version profile_image_url emits is cached for good; anything else revalidates.
+    cache_control = IMMUTABLE_CACHE_CONTROL if v == image_version(digest) else REVALIDATE_CACHE_CONTROL
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    image = row["profile_image"]
+    media_type = THUMBNAIL_CONTENT_TYPE if variant else sniff_content_type(image)
+    return Response(content=image, media_type=media_type, headers=headers)
+
+# ----------------------------------------------------------------------
+# TABLE FIELDS ENDPOINT
+# ----------------------------------------------------------------------
+@app.get("/api/fields/{table_name}")
+async def get_table_fields(table_name: str):
+    if table_name not in tables:
+        raise HTTPException(status_code=400, detail="Invalid table name.")
+    return [{"column_name": col_name, "data_type": data_type} for col_name, data_type in get_table_columns(table_name)]
+
+# ----------------------------------------------------------------------
+# CONNECTION POOL / EXECUTOR METRICS
+# ----------------------------------------------------------------------
+@app.get("/api/stats/pool")
+async def get_pool_stats():
+    return db_pool.stats()
+
+@app.get("/api/stats/executor")
+async def get_executor_stats():
+    return dict(db_executor.stats(), streams=stream_limiter.stats())
+
+@app.get("/api/stats/cache")
+async def get_cache_stats():
+    return record_cache.stats()
+
+@app.get("/api/stats/write-behind")
+async def get_write_behind_stats():
+    return dict(write_behind_queue.stats(), tables=list(WRITE_BEHIND_TABLES)) if write_behind_queue else {"tables": []}
+
+@app.get("/api/stats/unread-notifications")
+async def get_unread_notification_stats():
+    return unread_counters.stats()
+
+@app.get("/api/stats/realtime")
+async def get_realtime_stats():
+    return realtime_broker.stats()
+
+@app.get("/api/stats/thumbnails")
+async def get_thumbnail_stats():
+    return dict(thumbnail_store.cache.stats(), enabled=thumbnail_store.enabled, executor=thumbnail_executor.stats())
+
 # ----------------------------------------------------------------------
 # LOGIN ENDPOINT – accepts login (email, username or phone) and password
 # ----------------------------------------------------------------------
@@ -337,32 +2260,155 @@ class LoginModel(BaseModel):
     login: str
     password: str
 
+# Column(s) a login identifier is looked up by, in order. Each should carry a
+# unique index so the lookup is a single seek.
+PHONE_NUMBER_PATTERN = re.compile(r"^\+?[\d\s().-]+$")
+
+def login_columns(identifier: str) -> List[str]:
+    if "@" in identifier:
+        return ["email"]
+    if PHONE_NUMBER_PATTERN.match(identifier):
+        # All-digit usernames exist too, so fall back to username.
+        return ["phone_number", "username"]
+    return ["username"]
+
 @app.post("/api/login")
-async def login(credentials: LoginModel):
+async def login(credentials: LoginModel, fields: Optional[str] = None):
+    tokens = require_token_service()
+    columns = parse_fields("Users", fields, ("user_id",))
+    account = await run_db(fetch_login_account, credentials.login.strip())
+    stored = account["password_hash"] if account else DUMMY_PASSWORD_HASH
+    matches, needs_rehash = await run_password_work(verify_password, credentials.password, stored or "")
+    if not account or not matches:
+        raise HTTPException(status_code=401, detail="Invalid login credentials")
+    if needs_rehash:
+        password_executor.submit_background(upgrade_password_hash, account["user_id"], stored, credentials.password)
+    user = await run_db(fetch_login_user, account["user_id"], columns)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid login credentials")
+    return dict({"message": "Login successful", "user": user}, **tokens.issue(account["user_id"]))
+
+def fetch_login_account(identifier: str) -> Optional[Dict[str, Any]]:
     conn = get_db_connection()
     try:
         cursor = conn.cursor(as_dict=True)
-        query = """
-            SELECT * FROM Users 
-            WHERE (email = %s OR username = %s OR phone_number = %s) 
-              AND password_hash = %s 
-              AND is_deleted = 0
-        """
-        cursor.execute(query, (credentials.login, credentials.login, credentials.login, credentials.password))
+        for column in login_columns(identifier):
+            cursor.execute(
+                f"SELECT TOP (1) user_id, password_hash FROM Users WHERE {column} = %s AND is_deleted = 0",
+                (identifier,),
+            )
+            account = cursor.fetchone()
+            if account:
+                return account
+        return None
+    except Exception as e:
+        logging.error(f"Login failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Login failed: " + str(e))
+    finally:
+        conn.close()
+
+def fetch_login_user(user_id: int, columns: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(f"SELECT {select_columns('Users', columns)} FROM Users WHERE user_id = %s AND is_deleted = 0",
+                       (user_id,))
         user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid login credentials")
-        user = clean_users_record(user)
-        return {"message": "Login successful", "user": user}
+        return clean_users_record(user) if user else None
     except Exception as e:
         logging.error(f"Login failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Login failed: " + str(e))
     finally:
         conn.close()
 
+def upgrade_password_hash(user_id: int, stored: str, password: str):
+    # Legacy plaintext (or weaker-cost) values are replaced after a successful login.
+    # The old value is part of the WHERE so a concurrent password change is not overwritten.
+    new_hash = hash_password(password)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE Users SET password_hash = %s WHERE user_id = %s AND password_hash = %s",
+                       (new_hash, user_id, stored))
+        conn.commit()
+        run_after_commit([(record_cache.invalidate, "Users", user_id)])
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Could not upgrade password hash for user {user_id}: {str(e)}")
+    finally:
+        conn.close()
+
+class RefreshModel(BaseModel):
+    refresh_token: str
+
+class LogoutModel(BaseModel):
+    refresh_token: Optional[str] = None
+
+@app.post("/api/token/refresh")
+async def refresh_token(body: RefreshModel):
+    # Refresh tokens are single-use: each refresh revokes the one presented.
+    try:
+        return require_token_service().refresh(body.refresh_token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+@app.post("/api/logout")
+async def logout(body: LogoutModel = Body(LogoutModel()), current_user: Dict[str, Any] = Depends(get_current_user)):
+    token_service.revoke(current_user)
+    if body.refresh_token:
+        token_service.revoke_token(body.refresh_token, REFRESH_TOKEN)
+    return {"message": "Logged out"}
+
+@app.get("/api/me")
+async def get_me(current_user: Dict[str, Any] = Depends(get_current_user)):
+    return {"user_id": current_user["user_id"], "expires_at": current_user["exp"]}
+
 # ----------------------------------------------------------------------
 # APP ENTRY POINT
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8003, reload=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ShadowTalk API")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="run the development server (default)")
+    commands.add_parser("schema-snapshot", help="regenerate the on-disk schema snapshot from the database")
+    commands.add_parser("reconcile-counters", help="add Posts like/comment counters and rowversion if missing and repair drift")
+    commands.add_parser("create-indexes", help="create the recommended Messages indexes if missing")
+    commands.add_parser("add-rowversion", help="add rowversion columns for delta sync to SYNC_ROWVERSION_TABLES")
+    args = parser.parse_args()
+
+    if args.command == "schema-snapshot":
+        changed = schema_cache.refresh()
+        print(f"Wrote {SCHEMA_SNAPSHOT_PATH} ({len(changed)} table(s) changed)")
+    elif args.command == "reconcile-counters":
+        conn = get_db_connection()
+        try:
+            ensure_counter_columns(conn)
+            # Counter changes leave updated_at alone, so delta sync needs a rowversion on Posts.
+            ensure_rowversion_columns(conn, ("Posts",))
+            repaired = reconcile_counters(conn)
+        finally:
+            conn.close()
+        # New counter columns only take effect once the snapshot knows about them.
+        schema_cache.refresh()
+        print(f"Repaired counters for {len(repaired)} post(s)")
+    elif args.command == "add-rowversion":
+        conn = get_db_connection()
+        try:
+            added = ensure_rowversion_columns(conn)
+        finally:
+            conn.close()
+        # Delta sync only uses the new columns once the snapshot knows about them.
+        schema_cache.refresh()
+        print(f"Ensured rowversion columns on: {', '.join(added) or 'no tables'}")
+    elif args.command == "create-indexes":
+        conn = get_db_connection()
+        try:
+            print(f"Ensured indexes: {', '.join(create_message_indexes(conn))}")
+        finally:
+            conn.close()
+    else:
+        import uvicorn
+        os.environ.setdefault("SHADOWTALK_DEV", "1")
+        uvicorn.run("main:app", host="0.0.0.0", port=8003, reload=True)
@@ -0,0 +1,86 @@
+import base64
+import datetime
+import decimal
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=_encode_value).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw, object_hook=_decode_value)
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not isinstance(payload, dict):
+        raise ValueError("Malformed cursor")
+    return payload
+
+
+def _encode_value(value: Any):
+    # Keep datetimes typed so they go back to SQL Server as datetime parameters
+    # rather than strings whose precision depends on the column type.
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"$dec": str(value)}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def _decode_value(obj: Dict[str, Any]):
+    if "$dt" in obj:
+        return datetime.datetime.fromisoformat(obj["$dt"])
+    if "$d" in obj:
+        return datetime.date.fromisoformat(obj["$d"])
+    if "$dec" in obj:
+        return decimal.Decimal(obj["$dec"])
+    return obj
+
+
+def keyset_condition(sort_column: str, pk_name: str, descending: bool, last_value: Any,
+                     last_pk: Any) -> Tuple[str, List[Any]]:
+    """
+    WHERE fragment selecting the rows that come after (last_value, last_pk) in
+    ORDER BY sort_column, pk_name (both ASC or both DESC).
+
+    SQL Server sorts NULLs first ascending and last descending, so NULL sort
+    values get their own branch instead of a plain comparison.
+    """
+    if sort_column == pk_name:
+        return f"{pk_name} {'<' if descending else '>'} %s", [last_pk]
+    op = "<" if descending else ">"
+    if last_value is None:
+        if descending:
+            return f"({sort_column} IS NULL AND {pk_name} < %s)", [last_pk]
+        return f"(({sort_column} IS NULL AND {pk_name} > %s) OR {sort_column} IS NOT NULL)", [last_pk]
+    condition = f"{sort_column} {op} %s OR ({sort_column} = %s AND {pk_name} {op} %s)"
+    if descending:
+        condition += f" OR {sort_column} IS NULL"
+    return f"({condition})", [last_value, last_value, last_pk]
+
+
+def order_by(sort_column: str, pk_name: str, descending: bool) -> str:
+    direction = "DESC" if descending else "ASC"
+    if sort_column == pk_name:
+        return f"{pk_name} {direction}"
+    return f"{sort_column} {direction}, {pk_name} {direction}"
+
+
+def next_cursor(rows: List[Dict[str, Any]], limit: int, sort_column: str, pk_name: str,
+                descending: bool) -> Optional[str]:
+    """Returns the cursor for the page after ``rows`` (fetched with limit + 1), or None on the last page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor({
+        "s": sort_column,
+        "o": "desc" if descending else "asc",
+        "v": last.get(sort_column),
+        "k": last.get(pk_name),
+    })
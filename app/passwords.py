@@ -0,0 +1,59 @@
+import base64
+import hashlib
+import hmac
+import os
+from typing import Tuple
+
+# scrypt cost parameters for new hashes; stored hashes carry their own, so these
+# can be raised later and old rows are upgraded on their next login
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+HASH_PREFIX = "scrypt$"
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _derive(password: str, salt: bytes, n: int, r: int, p: int, length: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=length,
+                          maxmem=128 * r * (n + p + 2))
+
+
+def hash_password(password: str) -> str:
+    """Returns ``scrypt$n$r$p$salt$hash`` (salt and hash base64) for storing in Users.password_hash."""
+    salt = os.urandom(SCRYPT_SALT_BYTES)
+    key = _derive(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P, SCRYPT_KEY_BYTES)
+    return f"{HASH_PREFIX}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def is_password_hash(value: str) -> bool:
+    return isinstance(value, str) and value.startswith(HASH_PREFIX)
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Checks ``password`` against a stored value and returns (matches, needs_rehash).
+
+    Rows written before hashing was introduced hold the plaintext; those still
+    verify, and report needs_rehash so the caller can replace them.
+    """
+    if not stored:
+        return False, False
+    if not is_password_hash(stored):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, key = base64.b64decode(salt), base64.b64decode(key)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(_derive(password, salt, n, r, p, len(key)), key)
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# Verified when the login does not exist, so unknown and known accounts take the same time
+DUMMY_PASSWORD_HASH = hash_password(_b64(os.urandom(SCRYPT_SALT_BYTES)))
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Child table -> (Posts counter column, whether the child table is soft-deleted).
+# A child row counts towards its post while it has a post_id and is not deleted.
+COUNTER_SOURCES = {
+    "Likes": ("like_count", False),
+    "Comments": ("comment_count", True),
+}
+COUNTER_COLUMNS = tuple(column for column, _ in COUNTER_SOURCES.values())
+
+# Posts per UPDATE when applying deltas and per transaction when reconciling
+COUNTER_UPDATE_CHUNK = 1000
+RECONCILE_BATCH_SIZE = 5000
+
+ENSURE_COUNTER_COLUMNS_SQL = "\n".join(
+    f"IF COL_LENGTH('Posts', '{column}') IS NULL "
+    f"ALTER TABLE Posts ADD {column} INT NOT NULL CONSTRAINT DF_Posts_{column} DEFAULT 0;"
+    for column in COUNTER_COLUMNS
+)
+
+
+def tracks_counters(table_name: str) -> bool:
+    return table_name in COUNTER_SOURCES
+
+
+def counter_output(table_name: str, old: bool = True, new: bool = True) -> List[str]:
+    """
+    OUTPUT expressions exposing a row's post_id (and is_deleted) before and/or
+    after a write, aliased counter_* so they can be popped off returned records.
+    """
+    _, soft_deleted = COUNTER_SOURCES[table_name]
+    expressions = []
+    for enabled, prefix, name in ((old, "DELETED", "old"), (new, "INSERTED", "new")):
+        if not enabled:
+            continue
+        expressions.append(f"{prefix}.post_id AS counter_{name}_post_id")
+        if soft_deleted:
+            expressions.append(f"{prefix}.is_deleted AS counter_{name}_is_deleted")
+    return expressions
+
+
+def pop_counter_values(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: record.pop(key) for key in [key for key in record if key.startswith("counter_")]}
+
+
+def inserted_counter_row(data_dict: Dict[str, Any]) -> Dict[str, Any]:
+    # Inserts need no OUTPUT: the written values are already known.
+    return {"counter_new_post_id": data_dict.get("post_id"), "counter_new_is_deleted": data_dict.get("is_deleted")}
+
+
+def counter_deltas(rows: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    deltas: Counter = Counter()
+    for row in rows:
+        for name, sign in (("old", -1), ("new", 1)):
+            key = f"counter_{name}_post_id"
+            if key in row and row[key] is not None and not row.get(f"counter_{name}_is_deleted"):
+                deltas[row[key]] += sign
+    return {post_id: delta for post_id, delta in deltas.items() if delta}
+
+
+def apply_counter_deltas(cursor, table_name: str, deltas: Dict[int, int]) -> List[int]:
+    """
+    Applies per-post deltas in the caller's transaction, one UPDATE per distinct
+    delta and chunk of posts. Returns the post ids whose counters changed.
+    """
+    column, _ = COUNTER_SOURCES[table_name]
+    by_delta: Dict[int, List[int]] = {}
+    for post_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(post_id)
+    for delta, post_ids in by_delta.items():
+        for start in range(0, len(post_ids), COUNTER_UPDATE_CHUNK):
+            chunk = post_ids[start:start + COUNTER_UPDATE_CHUNK]
+            cursor.execute(
+                f"UPDATE Posts SET {column} = CASE WHEN {column} + %s < 0 THEN 0 ELSE {column} + %s END "
+                f"WHERE post_id IN ({', '.join(['%s'] * len(chunk))})",
+                (delta, delta) + tuple(chunk),
+            )
+    return list(deltas)
+
+
+def ensure_counter_columns(conn):
+    cursor = conn.cursor()
+    cursor.execute(ENSURE_COUNTER_COLUMNS_SQL)
+    conn.commit()
+
+
+def _reconcile_sql() -> str:
+    joins, sets, drift = [], [], []
+    for table_name, (column, soft_deleted) in COUNTER_SOURCES.items():
+        alias = f"src_{column}"
+        live = " AND is_deleted = 0" if soft_deleted else ""
+        joins.append(
+            f"LEFT JOIN (SELECT post_id, COUNT(*) AS total FROM {table_name} "
+            f"WHERE post_id BETWEEN %s AND %s{live} GROUP BY post_id) {alias} ON {alias}.post_id = p.post_id"
+        )
+        sets.append(f"{column} = ISNULL({alias}.total, 0)")
+        drift.append(f"p.{column} <> ISNULL({alias}.total, 0)")
+    return (
+        f"UPDATE p SET {', '.join(sets)} OUTPUT INSERTED.post_id FROM Posts p {' '.join(joins)} "
+        f"WHERE p.post_id BETWEEN %s AND %s AND ({' OR '.join(drift)})"
+    )
+
+
+def reconcile_counters(conn, batch_size: int = RECONCILE_BATCH_SIZE) -> List[int]:
+    """
+    Recomputes every post's counters from Likes/Comments with set-based UPDATEs
+    over post_id ranges, committing per range so locks stay short. Only rows that
+    drifted are written. Returns the ids of the repaired posts.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(post_id), MAX(post_id) FROM Posts")
+    low, high = cursor.fetchone()
+    if low is None:
+        return []
+    query = _reconcile_sql()
+    repaired = []
+    for start in range(low, high + 1, batch_size):
+        end = start + batch_size - 1
+        cursor.execute(query, (start, end) * len(COUNTER_SOURCES) + (start, end))
+        repaired.extend(row[0] for row in cursor.fetchall())
+        conn.commit()
+    return repaired
+
+
+def start_background_reconcile(connection_factory: Callable[[], Any], interval: float,
+                               on_repaired: Optional[Callable[[List[int]], None]] = None) -> threading.Thread:
+    def reconcile_loop():
+        while True:
+            time.sleep(interval)
+            conn = None
+            try:
+                conn = connection_factory()
+                repaired = reconcile_counters(conn)
+                if repaired:
+                    logging.warning(f"Repaired post counters for {len(repaired)} post(s)")
+                    if on_repaired:
+                        on_repaired(repaired)
+            except Exception as e:
+                logging.error(f"Post counter reconciliation failed: {str(e)}")
+                if conn is not None:
+                    conn.rollback()
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    thread = threading.Thread(target=reconcile_loop, name="post-counter-reconcile", daemon=True)
+    thread.start()
+    return thread
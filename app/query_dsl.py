@@ -0,0 +1,91 @@
+import decimal
+from typing import Any, Dict, List, Sequence, Tuple
+
+# where=column:operator[:value]; the value may itself contain colons (timestamps)
+COMPARISON_OPERATORS = {"eq": "=", "ne": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+PATTERN_OPERATORS = {"contains": "%{}%", "startswith": "{}%", "endswith": "%{}"}
+NULL_OPERATORS = {"isnull": "IS NULL", "notnull": "IS NOT NULL"}
+IN_SEPARATOR = "|"
+MAX_IN_VALUES = 500
+MAX_FILTERS = 10
+
+
+def coerce_value(sql_type: str, raw: str) -> Any:
+    """Converts a query-string value to the Python type pymssql binds for the column's SQL type."""
+    sql_type = sql_type.lower()
+    if "binary" in sql_type or "image" in sql_type:
+        raise ValueError("binary columns cannot be filtered")
+    if "int" in sql_type:
+        return int(raw)
+    if "bit" in sql_type:
+        lowered = raw.lower()
+        if lowered in ("1", "true"):
+            return True
+        if lowered in ("0", "false"):
+            return False
+        raise ValueError(f"'{raw}' is not a boolean")
+    if "decimal" in sql_type or "numeric" in sql_type or "money" in sql_type:
+        try:
+            return decimal.Decimal(raw)
+        except decimal.InvalidOperation:
+            raise ValueError(f"'{raw}' is not a number")
+    if "float" in sql_type or "real" in sql_type:
+        return float(raw)
+    # Dates and times go over as strings; SQL Server converts them to the column type.
+    return raw
+
+
+def escape_like(value: str) -> str:
+    return value.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+
+
+def compile_filters(expressions: Sequence[str], column_types: Dict[str, str]) -> Tuple[List[str], List[Any]]:
+    """
+    Compiles ?where= expressions into parameterized WHERE conditions (ANDed).
+    Only columns in ``column_types`` are accepted, so names are safe to put in SQL;
+    values are always bound as parameters. Raises ValueError on bad input.
+    """
+    if len(expressions) > MAX_FILTERS:
+        raise ValueError(f"At most {MAX_FILTERS} where expressions are allowed")
+    conditions, params = [], []
+    for expression in expressions:
+        parts = expression.split(":", 2)
+        if len(parts) < 2:
+            raise ValueError(f"Malformed where expression '{expression}', expected column:operator[:value]")
+        column, operator = parts[0].strip(), parts[1].strip().lower()
+        if column not in column_types:
+            raise ValueError(f"Unknown filter column '{column}'")
+        if operator in NULL_OPERATORS:
+            conditions.append(f"{column} {NULL_OPERATORS[operator]}")
+            continue
+        if len(parts) < 3:
+            raise ValueError(f"Operator '{operator}' needs a value")
+        raw = parts[2]
+        try:
+            if operator in COMPARISON_OPERATORS:
+                conditions.append(f"{column} {COMPARISON_OPERATORS[operator]} %s")
+                params.append(coerce_value(column_types[column], raw))
+            elif operator == "in":
+                values = [coerce_value(column_types[column], value) for value in raw.split(IN_SEPARATOR)]
+                if len(values) > MAX_IN_VALUES:
+                    raise ValueError(f"At most {MAX_IN_VALUES} values per 'in' filter")
+                conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+                params.extend(values)
+            elif operator in PATTERN_OPERATORS:
+                coerce_value(column_types[column], raw)
+                conditions.append(f"{column} LIKE %s")
+                params.append(PATTERN_OPERATORS[operator].format(escape_like(raw)))
+            else:
+                raise ValueError(f"Unknown operator '{operator}'")
+        except ValueError as e:
+            raise ValueError(f"Invalid where expression '{expression}': {str(e)}")
+    return conditions, params
+
+
+def parse_order(order: str) -> Tuple[str, bool]:
+    """Parses order=column[:asc|desc] into (column, descending)."""
+    column, _, direction = order.partition(":")
+    direction = (direction or "asc").strip().lower()
+    if direction not in ("asc", "desc"):
+        raise ValueError(f"Unknown sort direction '{direction}'")
+    return column.strip(), direction == "desc"
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+
+from app.streaming import json_default
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class Subscription:
+    """
+    One connected client's bounded event queue, owned by the event loop.
+
+    When the client reads slower than events arrive, the oldest events are
+    dropped and ``lagged`` is set, so the reader can catch up from the database
+    instead of the publisher blocking or memory growing without bound.
+    """
+
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.channel = channel
+        self.max_queue = max_queue
+        self.lagged = False
+        self.dropped = 0
+        self._loop = loop
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, event: Dict[str, Any]):
+        # Safe from any thread: the queue is only touched on the loop.
+        self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: Dict[str, Any]):
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+            self.lagged = True
+        self._queue.append(event)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Waits up to ``timeout`` seconds and returns every queued event (possibly none)."""
+        if not self._queue:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        events = list(self._queue)
+        self._queue.clear()
+        return events
+
+
+class InProcessBroker:
+    """Channel -> subscribers fan-out inside this process. ``publish`` may be called from any thread."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, channel: str, loop: asyncio.AbstractEventLoop, max_queue: int) -> Subscription:
+        subscription = Subscription(channel, loop, max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        self.deliver(channel, event)
+
+    def deliver(self, channel: str, event: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            self.published += 1
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscriptions = [sub for subs in self._subscribers.values() for sub in subs]
+            return {
+                "channels": len(self._subscribers),
+                "subscribers": len(subscriptions),
+                "published": self.published,
+                "dropped": sum(sub.dropped for sub in subscriptions),
+            }
+
+
+class SharedBroker(InProcessBroker):
+    """
+    Fans events out across processes through a redis-py style pub/sub client.
+    Publishing goes to the shared service; a listener thread hands everything
+    received on ``prefix:*`` to this process's local subscribers.
+    """
+
+    def __init__(self, client: Any, prefix: str):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self._listener = threading.Thread(target=self._listen, name="realtime-listener", daemon=True)
+        self._listener.start()
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        self.client.publish(f"{self.prefix}:{channel}", json.dumps(event, default=json_default))
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f"{self.prefix}:*")
+        for message in pubsub.listen():
+            try:
+                channel = message["channel"]
+                channel = channel.decode("utf-8") if isinstance(channel, bytes) else channel
+                self.deliver(channel[len(self.prefix) + 1:], json.loads(message["data"]))
+            except Exception as e:
+                logging.error(f"Dropping malformed realtime message: {str(e)}")
+
+
+def encode_event_id(watermarks: Dict[str, int]) -> str:
+    return ",".join(f"{table}:{value}" for table, value in sorted(watermarks.items()))
+
+
+def decode_event_id(event_id: Optional[str], tables: List[str]) -> Optional[Dict[str, int]]:
+    """Parses a Last-Event-ID of the form ``Messages:120,Notifications:45``; None if absent or unusable."""
+    if not event_id:
+        return None
+    try:
+        watermarks = {}
+        for part in event_id.split(","):
+            table, _, value = part.partition(":")
+            watermarks[table.strip()] = int(value)
+    except ValueError:
+        return None
+    if set(watermarks) != set(tables):
+        return None
+    return watermarks
+
+
+def sse_message(data: Any, event: Optional[str] = None, event_id: Optional[str] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=json_default, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+SSE_KEEPALIVE = b": keepalive\n\n"
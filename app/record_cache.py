@@ -0,0 +1,279 @@
+import copy
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.streaming import json_default
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:  # redis is optional; LocalSharedClient raises this one instead
+    class WatchError(Exception):
+        pass
+
+
+class MemoryBackend:
+    """In-process TTL + LRU store; values are deep-copied so callers can mutate what they get back."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def _set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+
+    def set_if_generation(self, key: str, value: Any, ttl: float, generation: int) -> bool:
+        with self._lock:
+            if self._generation != generation:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SharedBackend:
+    """
+    Store on a shared key-value service with a redis-py style client
+    (get / set(ex=) / delete / scan_iter / incr / pipeline). Values travel as JSON.
+
+    The generation lives in the service too, so an invalidation by any process
+    blocks every process's in-flight fills; ``set_if_generation`` is a WATCHed
+    compare-and-set against it.
+    """
+
+    def __init__(self, client: Any, namespace: str):
+        self.client = client
+        self.namespace = namespace
+        # Outside the namespace:* pattern, so clear() does not reset it.
+        self.generation_key = f"{namespace}#generation"
+        self.evictions = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def generation(self) -> int:
+        return int(self.client.get(self.generation_key) or 0)
+
+    def bump_generation(self):
+        self.client.incr(self.generation_key)
+
+    def set_if_generation(self, key: str, value: Any, ttl: float, generation: int) -> bool:
+        payload = json.dumps(value, default=json_default)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.generation_key)
+                if int(pipe.get(self.generation_key) or 0) != generation:
+                    return False
+                pipe.multi()
+                pipe.set(self._key(key), payload, ex=max(1, int(ttl)))
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.set(self._key(key), json.dumps(value, default=json_default), ex=max(1, int(ttl)))
+
+    def delete(self, key: str):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in list(self.client.scan_iter(match=f"{self.namespace}:*")):
+            self.client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class LocalSharedClient:
+    """Dict-backed stand-in for the shared cache client, for development and single-process runs."""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._values.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: str, ex: int):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ex, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self.get(key) or 0) + 1
+            self._values[key] = (math.inf, str(value))
+            return value
+
+    def scan_iter(self, match: str):
+        prefix = match.rstrip("*")
+        with self._lock:
+            return [key for key in self._values if key.startswith(prefix)]
+
+    def pipeline(self) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """The WATCH / MULTI / EXEC subset of a redis-py pipeline that SharedBackend uses."""
+
+    def __init__(self, client: LocalSharedClient):
+        self.client = client
+        self._watched: Dict[str, Any] = {}
+        self._queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._watched, self._queued = {}, []
+
+    def watch(self, *keys: str):
+        with self.client._lock:
+            self._watched.update((key, self.client._values.get(key)) for key in keys)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def multi(self):
+        self._queued = []
+
+    def set(self, key: str, value: str, ex: int):
+        self._queued.append((key, value, ex))
+
+    def execute(self):
+        with self.client._lock:
+            if any(self.client._values.get(key) is not entry for key, entry in self._watched.items()):
+                raise WatchError("Watched key changed")
+            for key, value, ex in self._queued:
+                self.client.set(key, value, ex)
+        self._watched, self._queued = {}, []
+
+
+class RecordCache:
+    """
+    Per-table read-through cache of single records keyed by primary key.
+
+    Readers take a generation token before going to the database and hand it
+    back when filling; any invalidation of the table in between makes the fill a
+    no-op, so a slow read can never put a pre-write row back into the cache. The
+    generation is kept by the backend, so with SharedBackend this holds across
+    processes, and the check and the store are one atomic step.
+    """
+
+    def __init__(self, backend_factory: Callable[[str], Any], ttl: float):
+        self.ttl = ttl
+        self._backend_factory = backend_factory
+        self._backends: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _backend(self, table_name: str):
+        with self._lock:
+            backend = self._backends.get(table_name)
+            if backend is None:
+                backend = self._backends[table_name] = self._backend_factory(table_name)
+                self._counters[table_name] = {"hits": 0, "misses": 0, "invalidations": 0}
+            return backend
+
+    def _count(self, table_name: str, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[table_name][counter] += amount
+
+    def get(self, table_name: str, pk: Any) -> Optional[Dict[str, Any]]:
+        value = self._backend(table_name).get(str(pk))
+        self._count(table_name, "hits" if value is not None else "misses")
+        return value
+
+    def generation(self, table_name: str) -> int:
+        return self._backend(table_name).generation()
+
+    def fill(self, table_name: str, pk: Any, record: Dict[str, Any], generation: int):
+        self._backend(table_name).set_if_generation(str(pk), record, self.ttl, generation)
+
+    def invalidate(self, table_name: str, pk: Any):
+        # Bumped before the delete: a fill that lands first is deleted, one that lands after is refused.
+        backend = self._backend(table_name)
+        backend.bump_generation()
+        backend.delete(str(pk))
+        self._count(table_name, "invalidations")
+
+    def invalidate_table(self, table_name: str):
+        backend = self._backend(table_name)
+        backend.bump_generation()
+        backend.clear()
+        self._count(table_name, "invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = dict(self._backends)
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        result = {}
+        for table_name, values in counters.items():
+            lookups = values["hits"] + values["misses"]
+            backend = backends[table_name]
+            result[table_name] = dict(
+                values,
+                hit_ratio=round(values["hits"] / lookups, 4) if lookups else 0.0,
+                entries=backend.size(),
+                evictions=backend.evictions,
+            )
+        return result
@@ -0,0 +1,172 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Bump whenever the snapshot layout changes; older files are then ignored and rebuilt.
+SNAPSHOT_VERSION = 2
+
+Columns = List[Tuple[str, str]]
+
+
+class TableSchema:
+    def __init__(self, columns: Columns, indexed: List[str]):
+        self.columns = columns
+        # Columns that lead an index, i.e. the ones SQL Server can seek or range-scan on
+        self.indexed = indexed
+
+    def __eq__(self, other):
+        return isinstance(other, TableSchema) and (self.columns, self.indexed) == (other.columns, other.indexed)
+
+
+def fetch_catalog(conn: Any, table_names: List[str]) -> Dict[str, TableSchema]:
+    """Reads the columns and indexed columns of every table in one round trip."""
+    placeholders = ", ".join(["%s"] * len(table_names))
+    query = f"""
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_NAME IN ({placeholders})
+        ORDER BY TABLE_NAME, ORDINAL_POSITION;
+
+        SELECT DISTINCT t.name, c.name
+        FROM sys.indexes i
+        JOIN sys.tables t ON t.object_id = i.object_id
+        JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        WHERE t.name IN ({placeholders}) AND ic.key_ordinal = 1 AND i.is_disabled = 0
+    """
+    cursor = conn.cursor()
+    cursor.execute(query, tuple(table_names) * 2)
+    columns: Dict[str, Columns] = {name: [] for name in table_names}
+    for table_name, column_name, data_type in cursor.fetchall():
+        columns[table_name].append((column_name, data_type))
+    indexed: Dict[str, List[str]] = {name: [] for name in table_names}
+    if cursor.nextset():
+        for table_name, column_name in cursor.fetchall():
+            indexed[table_name].append(column_name)
+    return {
+        name: TableSchema(columns[name], [col for col, _ in columns[name] if col in indexed[name]])
+        for name in table_names
+    }
+
+
+def load_snapshot(path: str, table_names: List[str]) -> Optional[Dict[str, TableSchema]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable schema snapshot {path}: {str(e)}")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logging.info(f"Ignoring schema snapshot {path} with version {snapshot.get('version')}")
+        return None
+    snapshot_tables = snapshot.get("tables", {})
+    missing = [name for name in table_names if not snapshot_tables.get(name, {}).get("columns")]
+    if missing:
+        logging.info(f"Schema snapshot {path} is missing tables: {', '.join(missing)}")
+        return None
+    return {
+        name: TableSchema(
+            [tuple(col) for col in snapshot_tables[name]["columns"]],
+            list(snapshot_tables[name].get("indexed", [])),
+        )
+        for name in table_names
+    }
+
+
+def write_snapshot(path: str, catalog: Dict[str, TableSchema]):
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "generated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "tables": {
+            name: {"columns": [list(col) for col in schema.columns], "indexed": schema.indexed}
+            for name, schema in sorted(catalog.items())
+        },
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+class SchemaCache:
+    """
+    Column metadata for the registered tables.
+
+    Loaded from the on-disk snapshot when it is present and current, otherwise
+    fetched with a single catalog query and written back as the new snapshot.
+    """
+
+    def __init__(self, table_names: List[str], snapshot_path: str, connection_factory: Callable[[], Any]):
+        self.table_names = list(table_names)
+        self.snapshot_path = snapshot_path
+        self._connection_factory = connection_factory
+        self._lock = threading.Lock()
+        self._catalog: Dict[str, TableSchema] = {}
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    def load(self):
+        catalog = load_snapshot(self.snapshot_path, self.table_names)
+        if catalog is not None:
+            with self._lock:
+                self._catalog = catalog
+            logging.info(f"Loaded schema snapshot from {self.snapshot_path}")
+            return
+        self.refresh()
+
+    def refresh(self) -> List[str]:
+        """Re-reads the catalog from the database, saves the snapshot and returns the tables that changed."""
+        conn = self._connection_factory()
+        try:
+            catalog = fetch_catalog(conn, self.table_names)
+        finally:
+            conn.close()
+        missing = [name for name, schema in catalog.items() if not schema.columns]
+        if missing:
+            logging.warning(f"No columns found for tables: {', '.join(missing)}")
+        with self._lock:
+            changed = [name for name in self.table_names if self._catalog.get(name) != catalog[name]]
+            self._catalog = catalog
+        try:
+            write_snapshot(self.snapshot_path, catalog)
+        except OSError as e:
+            # Serverless filesystems are read-only; the in-memory catalog is still good,
+            # but each cold start repeats the catalog query until a snapshot is deployed.
+            logging.warning(f"Could not write schema snapshot {self.snapshot_path}: {str(e)}; "
+                            f"deploy one generated with `python -m app.main schema-snapshot`")
+        return changed
+
+    def columns(self, table_name: str) -> Columns:
+        with self._lock:
+            schema = self._catalog.get(table_name)
+            return list(schema.columns) if schema else []
+
+    def indexed_columns(self, table_name: str) -> List[str]:
+        with self._lock:
+            schema = self._catalog.get(table_name)
+            return list(schema.indexed) if schema else []
+
+    def start_background_refresh(self, interval: float):
+        if self._refresh_thread is not None:
+            return
+
+        def refresh_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    changed = self.refresh()
+                    if changed:
+                        logging.warning(
+                            f"Schema changed for {', '.join(changed)}; restart to rebuild the request models"
+                        )
+                except Exception as e:
+                    logging.error(f"Background schema refresh failed: {str(e)}")
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="schema-refresh", daemon=True)
+        self._refresh_thread.start()
@@ -0,0 +1,178 @@
+import base64
+import datetime
+import decimal
+import json
+import threading
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+RowBatches = AsyncIterator[List[Dict[str, Any]]]
+
+
+class StreamCursor:
+    """
+    A pooled connection and dict cursor for one streamed query, driven one
+    blocking call at a time from executor threads.
+
+    Calls and ``close`` take the same lock, so a call left running after its
+    caller timed out or disconnected finishes before the connection goes back,
+    and a call that only starts after ``close`` never checks a connection out.
+    A stream closed before its last row discards the connection rather than
+    returning it with an unread result set.
+    """
+
+    def __init__(self, connection_factory: Callable[[], Any]):
+        self._connection_factory = connection_factory
+        self._lock = threading.Lock()
+        self._conn = None
+        self._cursor = None
+        self._closed = False
+        self._exhausted = False
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError("Stream has been closed")
+
+    def execute(self, query: str, params: tuple = ()):
+        with self._lock:
+            self._check_open()
+            self._conn = self._connection_factory()
+            self._cursor = self._conn.cursor(as_dict=True)
+            self._cursor.execute(query, params)
+
+    def fetchmany(self, size: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._check_open()
+            rows = self._cursor.fetchmany(size)
+            self._exhausted = not rows
+            return rows
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            conn, self._conn = self._conn, None
+            if conn is None:
+                return
+            if self._exhausted:
+                conn.close()
+            else:
+                conn.discard()
+
+
+class StreamsSaturated(Exception):
+    pass
+
+
+class StreamLimiter:
+    """
+    Caps concurrently streamed responses. Each one holds a pooled connection
+    until its last row is sent, so the limit is kept below the pool size to
+    leave connections for every other endpoint.
+
+    ``acquire`` raises StreamsSaturated when no slot is free and otherwise
+    returns a release callable that is safe to call more than once.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rejected = 0
+
+    def acquire(self) -> Callable[[], None]:
+        with self._lock:
+            if self._active >= self.limit:
+                self._rejected += 1
+                raise StreamsSaturated(f"{self._active} streams already open")
+            self._active += 1
+        released = []
+
+        def release():
+            with self._lock:
+                if not released:
+                    released.append(True)
+                    self._active -= 1
+        return release
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"limit": self.limit, "active": self._active, "rejected": self._rejected}
+
+
+async def release_when_done(chunks: AsyncIterator[bytes], release: Callable[[], None]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        release()
+
+
+def json_default(value: Any):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("utf-8")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_row(row: Dict[str, Any]) -> str:
+    return json.dumps(row, default=json_default, separators=(",", ":"))
+
+
+async def ndjson_chunks(batches: RowBatches) -> AsyncIterator[bytes]:
+    """One JSON document per line, one chunk per fetched batch."""
+    async for batch in batches:
+        yield "".join(encode_row(row) + "\n" for row in batch).encode("utf-8")
+
+
+async def json_array_chunks(batches: RowBatches) -> AsyncIterator[bytes]:
+    """A single JSON array written incrementally, one chunk per fetched batch."""
+    yield b"["
+    first = True
+    async for batch in batches:
+        if not batch:
+            continue
+        chunk = ",".join(encode_row(row) for row in batch)
+        yield (chunk if first else "," + chunk).encode("utf-8")
+        first = False
+    yield b"]"
+
+
+async def tagged_ndjson_chunks(sections: AsyncIterator[Tuple[str, List[Dict[str, Any]]]]) -> AsyncIterator[bytes]:
+    """NDJSON lines of {"table": ..., "row": ...} for multi-table streams."""
+    async for table_name, batch in sections:
+        yield "".join(
+            json.dumps({"table": table_name, "row": row}, default=json_default, separators=(",", ":")) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+async def json_object_chunks(sections: AsyncIterator[Tuple[str, List[Dict[str, Any]]]]) -> AsyncIterator[bytes]:
+    """
+    A JSON object of table name -> row array, written incrementally. Batches for
+    one table must arrive consecutively; an empty batch opens a table with no rows.
+    """
+    current = None
+    first_row = True
+    yield b"{"
+    async for table_name, batch in sections:
+        parts = []
+        if table_name != current:
+            if current is not None:
+                parts.append("],")
+            parts.append(json.dumps(table_name) + ":[")
+            current = table_name
+            first_row = True
+        if batch:
+            rows = ",".join(encode_row(row) for row in batch)
+            parts.append(rows if first_row else "," + rows)
+            first_row = False
+        yield "".join(parts).encode("utf-8")
+    yield b"]}" if current is not None else b"}"
@@ -0,0 +1,148 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.images import image_digest
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it the original image is served
+    Image = None
+    ImageOps = None
+
+# Square bounding boxes (px) that avatar variants are rendered at
+THUMBNAIL_SIZES = (48, 96, 192)
+THUMBNAIL_CACHE_BYTES = 32 * 1024 * 1024
+THUMBNAIL_DIR = os.path.join(tempfile.gettempdir(), "shadowtalk-thumbnails")
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_CONTENT_TYPE = "image/webp"
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: Any) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def put(self, key: Any, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._size, max_bytes=self.max_bytes)
+
+
+class ThumbnailStore:
+    """
+    Downscaled avatar variants keyed by (content hash, size).
+
+    Variants are written to ``directory`` and the hot ones are kept in memory.
+    Keying on the content hash means a new upload never serves a stale variant.
+    """
+
+    def __init__(self, directory: str, cache: ByteLRUCache, sizes=THUMBNAIL_SIZES):
+        self.directory = directory
+        self.cache = cache
+        self.sizes = tuple(sizes)
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def _path(self, digest: str, size: int) -> str:
+        return os.path.join(self.directory, f"{digest}-{size}.{THUMBNAIL_FORMAT.lower()}")
+
+    def get(self, digest: str, size: int) -> Optional[bytes]:
+        key = (digest, size)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        try:
+            with open(self._path(digest, size), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.cache.put(key, data)
+        return data
+
+    def put(self, digest: str, size: int, data: bytes):
+        self.cache.put((digest, size), data)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(digest, size)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(digest, size))
+        except OSError as e:
+            logging.warning(f"Could not store thumbnail {digest}-{size}: {str(e)}")
+
+    def render(self, image: bytes, size: int) -> Optional[bytes]:
+        if Image is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(image)) as source:
+                thumbnail = ImageOps.exif_transpose(source)
+                if thumbnail.mode not in ("RGB", "RGBA"):
+                    thumbnail = thumbnail.convert("RGBA")
+                thumbnail.thumbnail((size, size))
+                output = io.BytesIO()
+                thumbnail.save(output, format=THUMBNAIL_FORMAT, quality=80)
+                return output.getvalue()
+        except Exception as e:
+            logging.warning(f"Could not render {size}px thumbnail: {str(e)}")
+            return None
+
+    def get_or_render(self, digest: str, size: int, load_image: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        data = self.get(digest, size)
+        if data is not None:
+            return data
+        image = load_image()
+        if not image:
+            return None
+        data = self.render(image, size)
+        if data is not None:
+            self.put(digest, size, data)
+        return data
+
+    def pregenerate(self, image: bytes):
+        """Renders every variant of a freshly uploaded image."""
+        if Image is None or not image:
+            return
+        digest = image_digest(image)
+        for size in self.sizes:
+            if self.get(digest, size) is None:
+                data = self.render(image, size)
+                if data is not None:
+                    self.put(digest, size, data)
+
+
+thumbnail_store = ThumbnailStore(THUMBNAIL_DIR, ByteLRUCache(THUMBNAIL_CACHE_BYTES))
@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict
+
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+_HEADER = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode("utf-8"))
+
+
+class RevocationList:
+    """Revoked token ids, each kept only until the token would have expired anyway."""
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: float):
+        with self._lock:
+            self._revoked[jti] = expires_at
+            self._purge(time.time())
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            return jti in self._revoked
+
+    def _purge(self, now: float):
+        for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[jti]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._revoked)
+
+
+class TokenService:
+    """
+    Issues and verifies HS256 JWTs. Verification is a HMAC plus a set lookup,
+    with no database round trip; refresh tokens are single-use and rotate.
+    """
+
+    def __init__(self, secret: bytes, access_ttl: int, refresh_ttl: int):
+        self._secret = secret
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.revocations = RevocationList()
+
+    def _sign(self, signing_input: str) -> str:
+        return _b64encode(hmac.new(self._secret, signing_input.encode("ascii"), hashlib.sha256).digest())
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        signing_input = f"{_HEADER}.{payload}"
+        return f"{signing_input}.{self._sign(signing_input)}"
+
+    def decode(self, token: str, token_type: str = ACCESS_TOKEN) -> Dict[str, Any]:
+        try:
+            header, payload, signature = token.split(".")
+        except ValueError:
+            raise TokenError("Malformed token")
+        if header != _HEADER or not hmac.compare_digest(signature, self._sign(f"{header}.{payload}")):
+            raise TokenError("Invalid token signature")
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise TokenError("Malformed token")
+        if claims.get("type") != token_type:
+            raise TokenError(f"Expected a {token_type} token")
+        if claims.get("exp", 0) <= time.time():
+            raise TokenError("Token has expired")
+        if self.revocations.is_revoked(claims.get("jti", "")):
+            raise TokenError("Token has been revoked")
+        return claims
+
+    def _claims(self, user_id: int, token_type: str, ttl: int, extra: Dict[str, Any]) -> Dict[str, Any]:
+        now = int(time.time())
+        return dict(extra, sub=str(user_id), type=token_type, iat=now, exp=now + ttl, jti=uuid.uuid4().hex)
+
+    def issue(self, user_id: int, **extra: Any) -> Dict[str, Any]:
+        return {
+            "access_token": self.encode(self._claims(user_id, ACCESS_TOKEN, self.access_ttl, extra)),
+            "refresh_token": self.encode(self._claims(user_id, REFRESH_TOKEN, self.refresh_ttl, extra)),
+            "token_type": "bearer",
+            "expires_in": self.access_ttl,
+        }
+
+    def refresh(self, refresh_token: str) -> Dict[str, Any]:
+        claims = self.decode(refresh_token, REFRESH_TOKEN)
+        self.revoke(claims)
+        extra = {key: value for key, value in claims.items() if key not in ("sub", "type", "iat", "exp", "jti")}
+        return self.issue(int(claims["sub"]), **extra)
+
+    def revoke(self, claims: Dict[str, Any]):
+        self.revocations.revoke(claims["jti"], claims["exp"])
+
+    def revoke_token(self, token: str, token_type: str):
+        try:
+            self.revoke(self.decode(token, token_type))
+        except TokenError:
+            pass
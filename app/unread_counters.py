@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+UNREAD_TABLE = "Notifications"
+UNREAD_COLUMNS = ("user_id", "is_read")
+
+COUNT_UNREAD_SQL = f"SELECT COUNT(*) AS unread FROM {UNREAD_TABLE} WHERE user_id = %s AND is_read = 0"
+
+
+def tracks_unread(table_name: str) -> bool:
+    return table_name == UNREAD_TABLE
+
+
+def unread_output(old: bool = True, new: bool = True) -> List[str]:
+    """
+    OUTPUT expressions exposing a notification's owner and read flag before
+    and/or after a write, aliased unread_* so they can be popped off returned records.
+    """
+    expressions = []
+    for enabled, prefix, name in ((old, "DELETED", "old"), (new, "INSERTED", "new")):
+        if enabled:
+            expressions += [f"{prefix}.{col} AS unread_{name}_{col}" for col in UNREAD_COLUMNS]
+    return expressions
+
+
+def pop_unread_values(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: record.pop(key) for key in [key for key in record if key.startswith("unread_")]}
+
+
+def inserted_unread_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    # A stored row read back whole (OUTPUT INSERTED.*) carries everything an insert needs.
+    return {f"unread_new_{col}": record.get(col) for col in UNREAD_COLUMNS}
+
+
+def unread_deltas(rows: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    deltas: Counter = Counter()
+    for row in rows:
+        for name, sign in (("old", -1), ("new", 1)):
+            key = f"unread_{name}_user_id"
+            if key in row and row[key] is not None and not row.get(f"unread_{name}_is_read"):
+                deltas[row[key]] += sign
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+class UnreadCounters:
+    """
+    Per-user unread notification counts, kept in process memory (TTL + LRU).
+
+    Writers ``hold`` the users they touch before committing and ``apply`` the
+    deltas after; a miss is rebuilt from SQL between ``begin_rebuild`` and
+    ``end_rebuild``. A rebuilt count is only cached if no write for that user
+    was in flight or applied meanwhile, since it may or may not include that
+    write. Holds left by rolled-back writes lapse after ``hold_seconds``; the
+    TTL bounds drift from writes made by other processes.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 100000, hold_seconds: float = 60.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hold_seconds = hold_seconds
+        self._counts: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self._held: Dict[int, Tuple[int, float]] = {}
+        self._rebuilding: Counter = Counter()
+        self._written: Dict[int, int] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "discarded_rebuilds": 0, "evictions": 0}
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._counts[user_id]
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counts.move_to_end(user_id)
+            self._counters["hits"] += 1
+            return entry[1]
+
+    def hold(self, deltas: Dict[int, int]):
+        """Marks a write to these users as in flight; call before commit."""
+        now = time.monotonic()
+        with self._lock:
+            for user_id in deltas:
+                writers, held_until = self._held.get(user_id, (0, 0.0))
+                self._held[user_id] = (writers + 1 if held_until > now else 1, now + self.hold_seconds)
+
+    def apply(self, deltas: Dict[int, int]):
+        """Adjusts cached counts after commit and releases the holds. Uncached users wait for their next rebuild."""
+        with self._lock:
+            self._sequence += 1
+            for user_id, delta in deltas.items():
+                writers, deadline = self._held.pop(user_id, (0, 0.0))
+                if writers > 1:
+                    self._held[user_id] = (writers - 1, deadline)
+                if user_id in self._rebuilding:
+                    self._written[user_id] = self._sequence
+                entry = self._counts.get(user_id)
+                if entry is not None:
+                    self._counts[user_id] = (entry[0], max(0, entry[1] + delta))
+
+    def begin_rebuild(self, user_id: int) -> int:
+        with self._lock:
+            self._rebuilding[user_id] += 1
+            return self._sequence
+
+    def end_rebuild(self, user_id: int, token: int, count: Optional[int]):
+        """Finishes a rebuild started with ``begin_rebuild``; ``count`` is None if the query failed."""
+        with self._lock:
+            if count is not None:
+                _, held_until = self._held.get(user_id, (0, 0.0))
+                if held_until and held_until <= time.monotonic():
+                    del self._held[user_id]
+                    held_until = 0.0
+                if self._written.get(user_id, -1) < token and not held_until:
+                    self._store(user_id, count)
+                else:
+                    self._counters["discarded_rebuilds"] += 1
+            self._rebuilding[user_id] -= 1
+            if not self._rebuilding[user_id]:
+                del self._rebuilding[user_id]
+                self._written.pop(user_id, None)
+
+    def _store(self, user_id: int, count: int):
+        self._counts[user_id] = (time.monotonic() + self.ttl, count)
+        self._counts.move_to_end(user_id)
+        while len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(
+                self._counters,
+                hit_ratio=round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                entries=len(self._counts),
+                writes_in_flight=len(self._held),
+            )
@@ -3,8 +3,13 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from .database import get_db
 from .models import User
+from .images import image_digest, profile_image_url
+from .passwords import hash_password, is_password_hash
+from .thumbnails import thumbnail_store
+from starlette.concurrency import run_in_threadpool
 import datetime
 import base64
+from typing import Optional
 
 router = APIRouter()
 
@@ -25,7 +30,8 @@ class UserResponse(BaseModel):
     hide_info: bool
     created_at: datetime.datetime
     updated_at: datetime.datetime
-    profile_image: str  # Base64-encoded string
+    profile_image_hash: Optional[str] = None  # SHA-256 of the image, also its ETag
+    profile_image_url: Optional[str] = None  # Served as raw bytes by /api/Users/{user_id}/profile-image
 
     class Config:
         from_attributes = True
@@ -35,6 +41,7 @@ class UserResponse(BaseModel):
 # Helper Functions
 # ---------------------------
 def user_to_response(user: User) -> dict:
+    digest = image_digest(user.profile_image) if user.profile_image else None
     return {
         "user_id": user.user_id,
         "email": user.email,
@@ -49,7 +56,8 @@ def user_to_response(user: User) -> dict:
         "hide_info": user.hide_info,
         "created_at": user.created_at,
         "updated_at": user.updated_at,
-        "profile_image": base64.b64encode(user.profile_image).decode('utf-8') if user.profile_image else "",
+        "profile_image_hash": digest,
+        "profile_image_url": profile_image_url(user.user_id, digest) if digest else None,
     }
 
 
@@ -95,11 +103,15 @@ async def create_user(
         raise HTTPException(status_code=400, detail="User with given email or username already exists")
 
     image_data = await profile_image.read() if profile_image else None
+    if image_data:
+        # Render the avatar variants up front so list views never wait on a resize
+        await run_in_threadpool(thumbnail_store.pregenerate, image_data)
 
     new_user = User(
         email=email,
         username=username,
-        password_hash=password_hash,
+        password_hash=password_hash if is_password_hash(password_hash)
+        else await run_in_threadpool(hash_password, password_hash),
         phone_number=phone_number,
         name=name or "Anonymous User",
         age=age,
@@ -130,7 +142,11 @@ def update_user(email: str, user_update: dict, db: Session = Depends(get_db)):
                 value = base64.b64decode(value)
             except Exception:
                 raise HTTPException(status_code=400, detail="Invalid profile_image data")
+        if field == "password_hash" and value and not is_password_hash(value):
+            value = hash_password(value)
         setattr(user, field, value)
+        if field == "profile_image" and value:
+            thumbnail_store.pregenerate(value)
 
     user.updated_at = datetime.datetime.utcnow()
     db.commit()
@@ -0,0 +1,257 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.streaming import json_default
+
+INSERT = "insert"
+DELETE = "delete"
+
+# Flush callback: applies entries to the database in one transaction and returns
+# the entries it rejected (each with an "error"); raising means retry later.
+FlushFn = Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]
+
+
+def cancel_pairs(entries: List[Dict[str, Any]], table_name: str, key_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Drops insert/delete pairs on the same key within one flush window, e.g. a
+    like followed by an unlike of the same post by the same user. Pairs cancel
+    only when the delete comes after the insert; everything else keeps its order.
+    """
+    keep = [True] * len(entries)
+    pending: Dict[Tuple[Any, ...], List[int]] = {}
+    for index, entry in enumerate(entries):
+        if entry["table"] != table_name:
+            continue
+        key = tuple(entry["data"].get(col) for col in key_columns)
+        stack = pending.setdefault(key, [])
+        if entry["op"] == DELETE and stack and entries[stack[-1]]["op"] == INSERT:
+            keep[stack.pop()] = False
+            keep[index] = False
+        else:
+            stack.append(index)
+    return [entry for entry, kept in zip(entries, keep) if kept]
+
+
+def entry_runs(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Groups consecutive entries with the same op, table and columns, so inserts become multi-row statements."""
+    runs: List[List[Dict[str, Any]]] = []
+    for entry in entries:
+        shape = (entry["op"], entry["table"], tuple(entry["data"].keys()))
+        if runs and (runs[-1][0]["op"], runs[-1][0]["table"], tuple(runs[-1][0]["data"].keys())) == shape:
+            runs[-1].append(entry)
+        else:
+            runs.append([entry])
+    return runs
+
+
+class WriteBehindQueue:
+    """
+    Acknowledge-then-write queue backed by a local append log.
+
+    ``submit`` appends the entry to the current log segment and fsyncs before
+    returning, so an acknowledged write survives a crash. A flusher thread seals
+    the segment when ``max_batch`` entries are pending or ``max_delay`` seconds
+    have passed, hands the entries to ``flush_fn`` and deletes the sealed segments
+    once it succeeds. A crash between the database commit and the segment deletion
+    replays those entries again, so delivery is at-least-once.
+
+    Each process logs into its own ``worker-*`` subdirectory of ``directory`` and
+    holds an exclusive ``flock`` on its lock file while running. On ``start`` the
+    segments of workers whose lock is free (i.e. that exited or crashed) are
+    claimed by renaming them into this worker's directory and replayed; live
+    workers' segments are never touched.
+    """
+
+    def __init__(self, directory: str, flush_fn: FlushFn, max_batch: int = 500, max_delay: float = 0.5,
+                 retry_delay: float = 5.0):
+        self.directory = directory
+        self.worker_directory: Optional[str] = None
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._pending: List[Dict[str, Any]] = []
+        self._sealed: List[str] = []
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._sequence = 0
+        self._worker_lock = None
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"accepted": 0, "flushed": 0, "rejected": 0, "replayed": 0, "flush_failures": 0}
+
+    def _new_segment_path(self) -> str:
+        self._sequence += 1
+        return os.path.join(self.worker_directory, f"segment-{time.time_ns():020d}-{self._sequence:06d}.jsonl")
+
+    def _open_segment(self):
+        self._segment_path = self._new_segment_path()
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def _seal_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._sealed.append(self._segment_path)
+        self._open_segment()
+
+    def _claim_worker_directory(self):
+        # The directory is locked before it gets its worker- name, so other
+        # processes never see it unlocked while this one is alive.
+        starting = os.path.join(self.directory, f".starting-{os.getpid()}-{time.time_ns()}")
+        os.makedirs(starting)
+        self._worker_lock = open(os.path.join(starting, "lock"), "w")
+        fcntl.flock(self._worker_lock, fcntl.LOCK_EX)
+        self.worker_directory = os.path.join(self.directory, "worker-" + os.path.basename(starting)[len(".starting-"):])
+        os.rename(starting, self.worker_directory)
+
+    def _claim_orphaned_segments(self) -> List[str]:
+        """Moves segments of exited workers (and pre-worker-directory logs) into this worker's directory."""
+        claimed = []
+        with open(os.path.join(self.directory, "replay.lock"), "w") as replay_lock:
+            fcntl.flock(replay_lock, fcntl.LOCK_EX)
+            orphans = [(self.directory, None)]
+            for worker in glob.glob(os.path.join(self.directory, "worker-*")):
+                if worker == self.worker_directory:
+                    continue
+                try:
+                    lock = open(os.path.join(worker, "lock"), "a")
+                except OSError:
+                    continue
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock.close()  # Still running; it flushes its own segments.
+                    continue
+                orphans.append((worker, lock))
+            for source, lock in orphans:
+                for path in sorted(glob.glob(os.path.join(source, "segment-*.jsonl"))):
+                    target = os.path.join(self.worker_directory, os.path.basename(path))
+                    os.rename(path, target)
+                    claimed.append(target)
+                if lock is not None:
+                    os.remove(lock.name)
+                    lock.close()
+                    try:
+                        os.rmdir(source)
+                    except OSError as e:
+                        logging.warning(f"Could not remove write-behind directory {source}: {str(e)}")
+        return sorted(claimed, key=os.path.basename)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._claim_worker_directory()
+        claimed = self._claim_orphaned_segments()
+        with self._lock:
+            for path in claimed:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._pending.append(json.loads(line))
+                        except ValueError:
+                            # A torn last line from a crash mid-append was never acknowledged.
+                            logging.warning(f"Skipping unreadable write-behind entry in {path}")
+                self._sealed.append(path)
+            self._counters["replayed"] += len(self._pending)
+            self._open_segment()
+        if self._pending:
+            logging.warning(f"Replaying {len(self._pending)} write-behind entries from {len(claimed)} orphaned segments")
+            self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: str, table_name: str, data: Dict[str, Any]):
+        entry = {"op": op, "table": table_name, "data": data}
+        line = json.dumps(entry, default=json_default, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._segment.write(line)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._pending.append(json.loads(line))
+            self._counters["accepted"] += 1
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            if not self.flush():
+                time.sleep(self.retry_delay)
+
+    def flush(self) -> bool:
+        """Flushes everything pending; returns False if the database write failed and will be retried."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return True
+                self._seal_segment()
+                batch, self._pending = self._pending, []
+                sealed = list(self._sealed)
+            started = time.monotonic()
+            try:
+                rejected = self.flush_fn(batch)
+            except Exception as e:
+                logging.error(f"Write-behind flush of {len(batch)} entries failed: {str(e)}")
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._counters["flush_failures"] += 1
+                return False
+            # The batch is committed from here on; it must not be retried whatever happens next.
+            if rejected:
+                try:
+                    self._dead_letter(rejected)
+                except OSError as e:
+                    logging.error(f"Could not dead-letter {len(rejected)} write-behind entries: {str(e)}; "
+                                  f"{json.dumps(rejected, default=json_default)}")
+            with self._lock:
+                for path in sealed:
+                    self._sealed.remove(path)
+                self._counters["flushed"] += len(batch) - len(rejected)
+                self._counters["rejected"] += len(rejected)
+                self._counters["last_flush_ms"] = round((time.monotonic() - started) * 1000, 3)
+            for path in sealed:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"Could not remove write-behind segment {path}: {str(e)}")
+            return True
+
+    def _dead_letter(self, rejected: List[Dict[str, Any]]):
+        logging.error(f"Write-behind rejected {len(rejected)} entries; see dead-letter.jsonl")
+        with open(os.path.join(self.directory, "dead-letter.jsonl"), "a", encoding="utf-8") as f:
+            for entry in rejected:
+                f.write(json.dumps(entry, default=json_default, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay + 1)
+        if not self.flush() or self._worker_lock is None:
+            return
+        # Nothing left to replay: drop this worker's directory instead of leaving an empty orphan behind.
+        with self._lock:
+            if self._pending or self._sealed:
+                return
+            self._segment.close()
+            os.remove(self._segment_path)
+            os.remove(os.path.join(self.worker_directory, "lock"))
+            self._worker_lock.close()
+            self._worker_lock = None
+            os.rmdir(self.worker_directory)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending), sealed_segments=len(self._sealed))